@@ -1,15 +1,15 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
+from utils.config import config_service
 
 class CommandOverview(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+    
+    @property
+    def config(self):
+        return config_service.get()
     
     @commands.command(name='commands', aliases=['hilfe', 'befehle'])
     async def commands_overview(self, ctx):
@@ -37,7 +37,8 @@ class CommandOverview(commands.Cog):
             value="`/balance` - Spice-Guthaben anzeigen\n"
                   "`/leaderboard` - Reichste Spieler anzeigen\n"
                   "`/give` - Spice vergeben (Mods)\n"
-                  "`/take` - Spice entziehen (Mods)",
+                  "`/take` - Spice entziehen (Mods)\n"
+                  "`/payout` - Raid/Event-Teilnehmer auszahlen (Raid Leader)",
             inline=False
         )
         
@@ -70,7 +71,10 @@ class CommandOverview(commands.Cog):
             value="`/temp_voice` - Eigenen Channel erstellen\n"
                   "`/temp_limit` - Benutzerlimit ändern\n"
                   "`/temp_name` - Channel umbenennen\n"
-                  "`/temp_kick` - Benutzer kicken",
+                  "`/temp_kick` - Benutzer kicken\n"
+                  "`/set-temp-trigger` - Join-to-Create Channel einrichten (Mods)\n"
+                  "`/remove-temp-trigger` - Join-to-Create Channel entfernen (Mods)\n"
+                  "`/temp-queue` - Join-to-Create Warteschlange anzeigen (Mods)",
             inline=False
         )
         
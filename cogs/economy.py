@@ -1,20 +1,97 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-import json
-import aiosqlite
 from datetime import datetime, timedelta
-from database import Database
-from utils.permissions import has_role_permission
+from utils.config import config_service
+from utils.permissions import has_role_permission, permission_resolver
+
+LEADERBOARD_PAGE_SIZE = 10
 
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
+        
+        # Rendered leaderboard pages by position, with the entries they show
+        self._page_cache = {}
+        
+        self.compact_ledger.start()
+    
+    @property
+    def config(self):
+        return config_service.get()
+    
+    async def cog_unload(self):
+        self.compact_ledger.cancel()
+        
+        # Make sure buffered balance changes reach the database
+        await self.db.flush()
+    
+    @tasks.loop(hours=24)
+    async def compact_ledger(self):
+        """Fold ledger entries older than the retention period into snapshots"""
+        retention_days = self.config.get('database', {}).get('ledger_retention_days', 90)
+        try:
+            removed = await self.db.compact_ledger(retention_days)
+            if removed:
+                print(f"🧾 {removed} alte Ledger-Einträge zusammengefasst")
+        except Exception as e:
+            print(f"❌ Fehler beim Zusammenfassen des Ledgers: {e}")
+    
+    @compact_ledger.before_loop
+    async def before_compact_ledger(self):
+        await self.bot.wait_until_ready()
+    
+    def leaderboard_page(self, cursor=None, before=False):
+        """Get (embed, position, entries) of a leaderboard page"""
+        position, entries = self.db.get_leaderboard_page(cursor, LEADERBOARD_PAGE_SIZE, before)
+        if not entries:
+            return None, position, entries
+        
+        # Balance changes elsewhere on the leaderboard (e.g. voice rewards)
+        # leave a page alone, it is only rendered again when what it shows changes
+        pages = max(1, -(-self.db.get_leaderboard_size() // LEADERBOARD_PAGE_SIZE))
+        cached = self._page_cache.get(position)
+        if cached and cached[0] == entries and cached[1] == pages:
+            return cached[2], position, entries
+        
+        embed = self.render_leaderboard_page(position, entries, pages)
+        self._page_cache[position] = (entries, pages, embed)
+        return embed, position, entries
+    
+    def render_leaderboard_page(self, position, entries, pages):
+        """Build the embed of a leaderboard page"""
+        embed = discord.Embed(
+            title="🏆 Spice Rangliste",
+            description=f"Die reichsten Mitglieder der Gilde:\n"
+                       f"Seite **{position // LEADERBOARD_PAGE_SIZE + 1}** von **{pages}**",
+            color=0xD4AF37
+        )
         
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        for rank, (user_id, balance) in enumerate(entries, position + 1):
+            user = self.bot.get_user(user_id)
+            username = user.display_name if user else f"Unbekannter Benutzer ({user_id})"
+            
+            medal = "🥇" if rank == 1 else "🥈" if rank == 2 else "🥉" if rank == 3 else f"{rank}."
+            embed.add_field(
+                name=f"{medal} {username}",
+                value=f"**{balance:,}** Spice",
+                inline=False
+            )
+        return embed
+    
+    def with_rank_footer(self, embed, user):
+        """Copy of a cached page with the viewer's own position as footer"""
+        embed = embed.copy()
+        embed.set_footer(text=self.rank_footer(user))
+        return embed
+    
+    def rank_footer(self, user):
+        """Footer text with the user's own leaderboard position"""
+        rank, total = self.db.get_balance_rank(user.id)
+        if rank is None:
+            return f"Du bist noch nicht in der Rangliste ({total:,} Mitglieder mit Spice)"
+        return f"Du bist #{rank:,} von {total:,}"
     
     @commands.command(name='balance', aliases=['bal', 'guthaben'])
     async def balance(self, ctx, member: discord.Member = None):
@@ -49,14 +126,14 @@ class Economy(commands.Cog):
 
     
     @commands.command(name='give', aliases=['geben'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'give')
     async def give_spice(self, ctx, member: discord.Member, amount: int):
         """Gibt einem Benutzer Spice (Nur für Moderatoren)"""
         if amount <= 0:
             await ctx.send("❌ Der Betrag muss positiv sein!")
             return
         
-        await self.db.update_user_balance(member.id, amount)
+        await self.db.update_user_balance(member.id, amount, reason='give', actor_id=ctx.author.id)
         
         embed = discord.Embed(
             title="💰 Spice übertragen",
@@ -67,68 +144,122 @@ class Economy(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='take', aliases=['nehmen'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'take')
     async def take_spice(self, ctx, member: discord.Member, amount: int):
         """Nimmt einem Benutzer Spice weg (Nur für Moderatoren)"""
         if amount <= 0:
             await ctx.send("❌ Der Betrag muss positiv sein!")
             return
         
-        current_balance = await self.db.get_user_balance(member.id)
-        if current_balance < amount:
-            await ctx.send(f"❌ {member.display_name} hat nur {current_balance:,} Spice!")
+        debited, balance = await self.db.debit_if_sufficient(
+            member.id, amount, reason='take', actor_id=ctx.author.id
+        )
+        if not debited:
+            await ctx.send(f"❌ {member.display_name} hat nur {balance:,} Spice!")
             return
         
-        await self.db.update_user_balance(member.id, -amount)
-        
         embed = discord.Embed(
             title="💸 Spice abgezogen",
-            description=f"**{amount:,}** Spice wurde von **{member.display_name}** abgezogen!",
+            description=f"**{amount:,}** Spice wurde von **{member.display_name}** abgezogen!\n"
+                       f"Neues Guthaben: **{balance:,}** Spice",
             color=0xFF6B6B
         )
         embed.set_footer(text=f"Abgezogen von {ctx.author.display_name}")
         await ctx.send(embed=embed)
     
-    @commands.command(name='leaderboard', aliases=['top', 'rangliste'])
-    async def leaderboard(self, ctx):
-        """Zeigt die Spice-Rangliste an"""
-        async with aiosqlite.connect(self.db.db_path) as db:
-            cursor = await db.execute('''
-                SELECT user_id, balance FROM economy 
-                WHERE balance > 0 
-                ORDER BY balance DESC 
-                LIMIT 10
-            ''')
-            results = await cursor.fetchall()
-        
-        if not results:
-            await ctx.send("❌ Noch keine Daten für die Rangliste vorhanden!")
+    @commands.command(name='payout', aliases=['auszahlung'])
+    @has_role_permission(['admin', 'moderator', 'raid_leader'], 'payout')
+    async def payout(self, ctx, raid_or_event_id: str, amount: int = 500, force: bool = False):
+        """Zahlt allen Angemeldeten eines Raids oder Events Spice aus"""
+        if amount <= 0:
+            await ctx.send("❌ Der Betrag muss positiv sein!")
+            return
+        
+        embed, error = await self._payout(raid_or_event_id, amount, ctx.author, force)
+        if error:
+            await ctx.send(error)
+            return
+        
+        await ctx.send(embed=embed)
+    
+    @app_commands.command(name="payout", description="Zahlt allen Angemeldeten eines Raids oder Events Spice aus")
+    @app_commands.describe(
+        raid_or_event_id="Die ID des Raids oder Events",
+        amount="Spice pro Teilnehmer",
+        force="Erneut auszahlen, auch wenn bereits ausgezahlt wurde"
+    )
+    async def payout_slash(self, interaction: discord.Interaction, raid_or_event_id: str, amount: int = 500, force: bool = False):
+        """Slash command version of payout"""
+        if not permission_resolver.can_use(interaction.user, 'payout', ['admin', 'moderator', 'raid_leader']):
+            await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
+            return
+        
+        if amount <= 0:
+            await interaction.response.send_message("❌ Der Betrag muss positiv sein!", ephemeral=True)
+            return
+        
+        embed, error = await self._payout(raid_or_event_id, amount, interaction.user, force)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
             return
         
+        await interaction.response.send_message(embed=embed)
+    
+    async def _payout(self, payout_id, amount, author, force=False):
+        """Pay every registrant once in one transaction, returns (embed, error message)"""
+        registrations = await self.db.get_raid_registrations(payout_id)
+        source = "Raid"
+        if not registrations:
+            registrations = await self.db.get_event_registrations(payout_id)
+            source = "Event"
+        if not registrations:
+            return None, f"❌ Keine Anmeldungen für `{payout_id}` gefunden!"
+        
+        user_ids = list(dict.fromkeys(registration[0] for registration in registrations))
+        paid = await self.db.bulk_adjust_balances(
+            [(user_id, amount) for user_id in user_ids],
+            reason=f'payout:{payout_id}',
+            actor_id=author.id,
+            payout_id=payout_id,
+            force=force
+        )
+        if paid is None:
+            previous = await self.db.get_payout(payout_id)
+            return None, (f"❌ `{payout_id}` wurde bereits am {previous[3]} an {previous[0]} Teilnehmer ausgezahlt! "
+                          f"Mit `force` erneut auszahlen.")
+        
         embed = discord.Embed(
-            title="🏆 Spice Rangliste",
-            description="Die reichsten Mitglieder der Gilde:",
-            color=0xD4AF37
+            title="💰 Auszahlung abgeschlossen",
+            description=f"**{len(user_ids)}** Teilnehmer von {source} `{payout_id}` haben je **{amount:,}** Spice erhalten!",
+            color=0x4CAF50
         )
+        embed.add_field(name="Gesamt", value=f"**{amount * len(user_ids):,}** Spice", inline=True)
         
-        for i, (user_id, balance) in enumerate(results, 1):
-            user = self.bot.get_user(user_id)
-            username = user.display_name if user else f"Unbekannter Benutzer ({user_id})"
-            
-            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-            embed.add_field(
-                name=f"{medal} {username}",
-                value=f"**{balance:,}** Spice",
-                inline=False
-            )
+        mentions = ", ".join(f"<@{user_id}>" for user_id in user_ids)
+        if len(mentions) > 1024:
+            mentions = mentions[:1020].rsplit(",", 1)[0] + ", …"
+        embed.add_field(name="Empfänger", value=mentions, inline=False)
         
-        await ctx.send(embed=embed)
+        embed.set_footer(text=f"Ausgezahlt von {author.display_name}")
+        return embed, None
+    
+    @commands.command(name='leaderboard', aliases=['top', 'rangliste'])
+    async def leaderboard(self, ctx):
+        """Zeigt die Spice-Rangliste an"""
+        embed, position, entries = self.leaderboard_page()
+        
+        if not entries:
+            await ctx.send("❌ Noch keine Daten für die Rangliste vorhanden!")
+            return
+        
+        view = LeaderboardView(self, ctx.author, position, entries)
+        await ctx.send(embed=self.with_rank_footer(embed, ctx.author), view=view)
     
     @app_commands.command(name="give-spice", description="Gibt einem Benutzer Spice (Nur für Moderatoren)")
     @app_commands.describe(member="Der Benutzer der Spice erhalten soll", amount="Die Menge an Spice")
     async def give_spice_slash(self, interaction: discord.Interaction, member: discord.Member, amount: int):
         """Slash command version of give_spice"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'give', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -136,7 +267,7 @@ class Economy(commands.Cog):
             await interaction.response.send_message("❌ Der Betrag muss positiv sein!", ephemeral=True)
             return
         
-        await self.db.update_user_balance(member.id, amount)
+        await self.db.update_user_balance(member.id, amount, reason='give', actor_id=interaction.user.id)
         
         embed = discord.Embed(
             title="💰 Spice übertragen",
@@ -150,7 +281,7 @@ class Economy(commands.Cog):
     @app_commands.describe(member="Der Benutzer dem Spice weggenommen werden soll", amount="Die Menge an Spice")
     async def take_spice_slash(self, interaction: discord.Interaction, member: discord.Member, amount: int):
         """Slash command version of take_spice"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'take', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -158,16 +289,17 @@ class Economy(commands.Cog):
             await interaction.response.send_message("❌ Der Betrag muss positiv sein!", ephemeral=True)
             return
         
-        current_balance = await self.db.get_user_balance(member.id)
-        if current_balance < amount:
-            await interaction.response.send_message(f"❌ {member.display_name} hat nur {current_balance:,} Spice!", ephemeral=True)
+        debited, balance = await self.db.debit_if_sufficient(
+            member.id, amount, reason='take', actor_id=interaction.user.id
+        )
+        if not debited:
+            await interaction.response.send_message(f"❌ {member.display_name} hat nur {balance:,} Spice!", ephemeral=True)
             return
         
-        await self.db.update_user_balance(member.id, -amount)
-        
         embed = discord.Embed(
             title="💸 Spice abgezogen",
-            description=f"**{amount:,}** Spice wurden von **{member.display_name}** abgezogen!",
+            description=f"**{amount:,}** Spice wurden von **{member.display_name}** abgezogen!\n"
+                       f"Neues Guthaben: **{balance:,}** Spice",
             color=0xF44336
         )
         embed.set_footer(text=f"Abgezogen von {interaction.user.display_name}")
@@ -176,52 +308,58 @@ class Economy(commands.Cog):
     @app_commands.command(name="leaderboard", description="Zeigt die Spice-Rangliste an")
     async def leaderboard_slash(self, interaction: discord.Interaction):
         """Slash command version of leaderboard"""
-        await interaction.response.defer()
-        
-        async with aiosqlite.connect(self.db.db_path) as db:
-            cursor = await db.execute('''
-                SELECT user_id, balance FROM economy 
-                ORDER BY balance DESC 
-                LIMIT 10
-            ''')
-            top_users = await cursor.fetchall()
+        embed, position, entries = self.leaderboard_page()
         
-        if not top_users:
+        if not entries:
             embed = discord.Embed(
                 title="📊 Spice Rangliste",
                 description="Noch keine Daten verfügbar!",
                 color=0x3498DB
             )
-            await interaction.followup.send(embed=embed)
+            await interaction.response.send_message(embed=embed)
             return
         
-        embed = discord.Embed(
-            title="📊 Spice Rangliste - Top 10",
-            description="Die reichsten Mitglieder unseres Hauses:",
-            color=0xFFD700
-        )
-        
-        for i, (user_id, balance) in enumerate(top_users[:10], 1):
-            user = self.bot.get_user(user_id)
-            username = user.display_name if user else f"Unbekannter Benutzer"
-            
-            # Medal emojis for top 3
-            if i == 1:
-                medal = "🥇"
-            elif i == 2:
-                medal = "🥈" 
-            elif i == 3:
-                medal = "🥉"
-            else:
-                medal = f"{i}."
-            
-            embed.add_field(
-                name=f"{medal} {username}",
-                value=f"**{balance:,}** Spice",
-                inline=False
-            )
+        view = LeaderboardView(self, interaction.user, position, entries)
+        await interaction.response.send_message(embed=self.with_rank_footer(embed, interaction.user), view=view)
+
+class LeaderboardView(discord.ui.View):
+    """Button navigation through the leaderboard, one keyset page at a time"""
+    
+    def __init__(self, economy, user, position, entries):
+        super().__init__(timeout=180)
+        self.economy = economy
+        self.user = user
+        self.set_page(position, entries)
+    
+    def set_page(self, position, entries):
+        # First and last entry are the cursors for the neighbouring pages
+        self.first = entries[0] if entries else None
+        self.last = entries[-1] if entries else None
+        self.previous_page.disabled = position == 0
+        self.next_page.disabled = position + len(entries) >= self.economy.db.get_leaderboard_size()
+    
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user.id:
+            await interaction.response.send_message("❌ Nutze `/leaderboard` um selbst zu blättern!", ephemeral=True)
+            return False
+        return True
+    
+    @discord.ui.button(label="Zurück", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.first, before=True)
+    
+    @discord.ui.button(label="Weiter", style=discord.ButtonStyle.primary, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.last)
+    
+    async def show(self, interaction, cursor, before=False):
+        embed, position, entries = self.economy.leaderboard_page(cursor, before)
+        if not entries:
+            # The page emptied since it was shown, start over at the top
+            embed, position, entries = self.economy.leaderboard_page()
         
-        await interaction.followup.send(embed=embed)
+        self.set_page(position, entries)
+        await interaction.response.edit_message(embed=self.economy.with_rank_footer(embed, self.user), view=self)
 
 async def setup(bot):
     await bot.add_cog(Economy(bot))
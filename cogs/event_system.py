@@ -1,19 +1,14 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
 from datetime import datetime, timedelta
-from database import Database
-from utils.permissions import has_role_permission
+from utils.config import config_service
+from utils.permissions import has_role_permission, permission_resolver
 
 class EventSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.db = bot.db
         
         # Event roles mapping
         self.event_roles = {
@@ -23,8 +18,12 @@ class EventSystem(commands.Cog):
             '📦': 'Carrier'
         }
     
+    @property
+    def config(self):
+        return config_service.get()
+    
     @commands.command(name='event', aliases=['create_event'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'event')
     async def create_event(self, ctx, title, *, description):
         """Erstellt ein neues Event mit Anmeldungssystem"""
         await self._create_event_process(title, description, ctx.author, ctx.send, ctx.channel.id)
@@ -34,16 +33,7 @@ class EventSystem(commands.Cog):
     async def create_event_slash(self, interaction: discord.Interaction, title: str, description: str):
         """Slash command version of create_event"""
         # Check permissions
-        user_role_ids = [role.id for role in interaction.user.roles] if hasattr(interaction.user, 'roles') else []
-        has_permission = False
-        
-        for role_name in ['admin', 'moderator']:
-            role_id = self.config['roles'].get(role_name)
-            if role_id and role_id in user_role_ids:
-                has_permission = True
-                break
-        
-        if not has_permission and hasattr(interaction, 'guild') and hasattr(interaction.guild, 'owner_id') and interaction.user.id != interaction.guild.owner_id:
+        if not permission_resolver.can_use(interaction.user, 'event', ['admin', 'moderator']):
             embed = discord.Embed(
                 title="❌ Keine Berechtigung",
                 description="Du benötigst Moderator- oder Admin-Rechte!",
@@ -165,7 +155,7 @@ class EventSystem(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='assign_crawler', aliases=['crawler'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'crawler')
     async def assign_crawler(self, ctx, event_id: str, member: discord.Member):
         """Meldet einen Spieler als Crawler an (nur Moderatoren)"""
         success = await self.register_for_event(event_id, member.id, member.display_name, 'Crawler')
@@ -188,7 +178,7 @@ class EventSystem(commands.Cog):
         await self.update_event_message(event_id)
     
     @commands.command(name='assign_carrier', aliases=['carrier'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'carrier')
     async def assign_carrier(self, ctx, event_id: str, member: discord.Member):
         """Meldet einen Spieler als Carrier an (nur Moderatoren)"""
         success = await self.register_for_event(event_id, member.id, member.display_name, 'Carrier')
@@ -212,8 +202,7 @@ class EventSystem(commands.Cog):
     
     async def event_autocomplete(self, interaction: discord.Interaction, current: str):
         """Autocomplete for event IDs with titles"""
-        import aiosqlite
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             cursor = await db.execute(
                 "SELECT event_id, title FROM events WHERE event_id LIKE ? OR title LIKE ? LIMIT 10",
                 (f"%{current}%", f"%{current}%")
@@ -237,16 +226,7 @@ class EventSystem(commands.Cog):
     async def event_edit_slash(self, interaction: discord.Interaction, event_id: str, member: discord.Member, role: str):
         """Slash command version of event editing"""
         # Check permissions
-        user_role_ids = [role.id for role in interaction.user.roles] if hasattr(interaction.user, 'roles') else []
-        has_permission = False
-        
-        for role_name in ['admin', 'moderator']:
-            role_id = self.config['roles'].get(role_name)
-            if role_id and role_id in user_role_ids:
-                has_permission = True
-                break
-        
-        if not has_permission and hasattr(interaction, 'guild') and hasattr(interaction.guild, 'owner_id') and interaction.user.id != interaction.guild.owner_id:
+        if not permission_resolver.can_use(interaction.user, 'event-edit', ['admin', 'moderator']):
             embed = discord.Embed(
                 title="❌ Keine Berechtigung",
                 description="Du benötigst Moderator- oder Admin-Rechte!",
@@ -382,28 +362,7 @@ class EventSystem(commands.Cog):
     
     async def store_event(self, event_id, creator_id, title, description, message_id, channel_id):
         """Store event information in database"""
-        import aiosqlite
-        async with aiosqlite.connect(self.db.db_path) as db:
-            # First check if table exists and add title column if missing
-            cursor = await db.execute("PRAGMA table_info(events)")
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS events (
-                    event_id TEXT PRIMARY KEY,
-                    creator_id INTEGER,
-                    description TEXT,
-                    message_id INTEGER,
-                    channel_id INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Add title column if it doesn't exist
-            if 'title' not in column_names:
-                await db.execute('ALTER TABLE events ADD COLUMN title TEXT DEFAULT ""')
-            
+        async with self.db.acquire() as db:
             await db.execute('''
                 INSERT OR REPLACE INTO events (event_id, creator_id, title, description, message_id, channel_id)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -412,20 +371,7 @@ class EventSystem(commands.Cog):
     
     async def register_for_event(self, event_id, user_id, username, role):
         """Register user for an event"""
-        import aiosqlite
-        async with aiosqlite.connect(self.db.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS event_registrations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    event_id TEXT,
-                    user_id INTEGER,
-                    username TEXT,
-                    role TEXT,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(event_id, user_id)
-                )
-            ''')
-            
+        async with self.db.acquire() as db:
             try:
                 await db.execute('''
                     INSERT INTO event_registrations (event_id, user_id, username, role)
@@ -438,8 +384,7 @@ class EventSystem(commands.Cog):
     
     async def unregister_from_event(self, event_id, user_id):
         """Unregister user from an event"""
-        import aiosqlite
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             cursor = await db.execute('''
                 DELETE FROM event_registrations
                 WHERE event_id = ? AND user_id = ?
@@ -449,22 +394,13 @@ class EventSystem(commands.Cog):
     
     async def get_event_registrations(self, event_id):
         """Get all registrations for an event"""
-        import aiosqlite
-        async with aiosqlite.connect(self.db.db_path) as db:
-            cursor = await db.execute('''
-                SELECT user_id, username, role, registered_at 
-                FROM event_registrations 
-                WHERE event_id = ?
-                ORDER BY registered_at
-            ''', (event_id,))
-            return await cursor.fetchall()
+        return await self.db.get_event_registrations(event_id)
     
     async def update_event_message(self, event_id):
         """Update the event message with current registrations"""
         try:
             # Get event info
-            import aiosqlite
-            async with aiosqlite.connect(self.db.db_path) as db:
+            async with self.db.acquire() as db:
                 cursor = await db.execute(
                     "SELECT message_id, channel_id, title, description, creator_id FROM events WHERE event_id = ?",
                     (event_id,)
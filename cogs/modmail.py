@@ -1,21 +1,19 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
 import asyncio
-import aiosqlite
 from datetime import datetime
-from database import Database
+from utils.config import config_service
 from utils.permissions import has_role_permission
 
 class ModMail(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.db = bot.db
+    
+    @property
+    def config(self):
+        return config_service.get()
     
     @commands.command(name='modmail', aliases=['mm'])
     async def create_modmail(self, ctx, *, message):
@@ -40,7 +38,7 @@ class ModMail(commands.Cog):
                 return
         
         # Check if user already has an open modmail thread
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             cursor = await db.execute(
                 "SELECT channel_id, status FROM modmail_threads WHERE user_id = ? AND status = 'open'", 
                 (user.id,)
@@ -56,7 +54,7 @@ class ModMail(commands.Cog):
 
         
         # Get modmail category
-        category_id = self.config['channels']['modmail_category']
+        category_id = self.db.get_guild_channel_id(guild.id, 'modmail_category')
         category = guild.get_channel(category_id) if category_id else None
         
         # Create modmail channel
@@ -69,7 +67,7 @@ class ModMail(commands.Cog):
         
         # Add permissions for moderators and admins
         for role_name in ['moderator', 'admin']:
-            role_id = self.config['roles'].get(role_name)
+            role_id = self.db.get_guild_role_id(guild.id, role_name)
             if role_id:
                 role = guild.get_role(role_id)
                 if role:
@@ -91,7 +89,7 @@ class ModMail(commands.Cog):
             return
         
         # Store in database
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             await db.execute('''
                 INSERT INTO modmail_threads (user_id, channel_id, status)
                 VALUES (?, ?, 'open')
@@ -128,18 +126,18 @@ class ModMail(commands.Cog):
         await ctx.send(embed=confirmation_embed)
         
         # Ping moderators (optional)
-        mod_role_id = self.config['roles'].get('moderator')
+        mod_role_id = self.db.get_guild_role_id(guild.id, 'moderator')
         if mod_role_id:
             mod_role = guild.get_role(mod_role_id)
             if mod_role:
                 await modmail_channel.send(f"{mod_role.mention} - Neues ModMail Ticket!")
     
     @commands.command(name='reply', aliases=['r'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'reply')
     async def reply_modmail(self, ctx, *, message):
         """Antwortet auf ein ModMail Ticket"""
         # Check if this is a modmail channel
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             cursor = await db.execute(
                 "SELECT user_id FROM modmail_threads WHERE channel_id = ? AND status = 'open'",
                 (ctx.channel.id,)
@@ -181,11 +179,11 @@ class ModMail(commands.Cog):
             await ctx.send("❌ Kann dem Benutzer keine DM senden! (DMs blockiert)")
     
     @commands.command(name='close')
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'close')
     async def close_modmail(self, ctx, *, reason="Kein Grund angegeben"):
         """Schließt ein ModMail Ticket"""
         # Check if this is a modmail channel
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             cursor = await db.execute(
                 "SELECT user_id FROM modmail_threads WHERE channel_id = ? AND status = 'open'",
                 (ctx.channel.id,)
@@ -200,7 +198,7 @@ class ModMail(commands.Cog):
         user = self.bot.get_user(user_id)
         
         # Update database
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             await db.execute(
                 "UPDATE modmail_threads SET status = 'closed' WHERE channel_id = ?",
                 (ctx.channel.id,)
@@ -246,7 +244,7 @@ class ModMail(commands.Cog):
             return
         
         # Check if user has an open modmail thread
-        async with aiosqlite.connect(self.db.db_path) as db:
+        async with self.db.acquire() as db:
             cursor = await db.execute(
                 "SELECT channel_id FROM modmail_threads WHERE user_id = ? AND status = 'open'",
                 (message.author.id,)
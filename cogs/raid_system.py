@@ -1,19 +1,14 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 from datetime import datetime, timedelta
-from database import Database
+from utils.config import config_service
 from utils.permissions import has_role_permission
 
 class RaidSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.db = bot.db
         
         # Available roles for raids
         self.raid_roles = [
@@ -25,8 +20,12 @@ class RaidSystem(commands.Cog):
             "👥 Flex (Beliebig)"
         ]
     
+    @property
+    def config(self):
+        return config_service.get()
+    
     @commands.command(name='createraid', aliases=['raid_erstellen'])
-    @has_role_permission(['admin', 'moderator', 'raid_leader'])
+    @has_role_permission(['admin', 'moderator', 'raid_leader'], 'createraid')
     async def create_raid(self, ctx, *, description):
         """Erstellt eine neue Raid-Anmeldung"""
         # Generate unique raid ID
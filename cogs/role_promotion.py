@@ -1,92 +1,390 @@
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-import json
+import asyncio
 from datetime import datetime, timedelta
-from database import Database
-from utils.permissions import has_role_permission
+from utils.config import config_service
+from utils.permissions import has_role_permission, permission_resolver
+from utils.voice_router import JOIN, LEAVE, SWITCH
 
 class RolePromotion(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
         
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        # Active voice sessions: member id -> (session start, channel id)
+        self.voice_sessions = {}
         
-        # Start the promotion check task
+        # Start of the stay in the current channel, logged to the session history
+        self._segment_starts = {}
+        
+        # Sessions left open by the previous run are closed once per process,
+        # heartbeats wait for it so the downtime is not counted as voice time
+        self._sessions_reconciled = False
+        self._reconcile_done = asyncio.Event()
+        
+        # Promotion sweeps never overlap, role edits run a few at a time
+        self._promotion_lock = asyncio.Lock()
+        self.promotion_concurrency = 3
+        
+        # Members whose promotion is currently in flight
+        self._promoting = set()
+        
+        # Voice rewards: member id -> time accrued up to, and not yet paid Spice
+        self._reward_accrued_at = {}
+        self._reward_credit = {}
+        
+        # Promotion happens when a session is banked, the loop only reconciles
+        self.check_promotions.change_interval(
+            seconds=self.config['voice_promotion'].get('check_interval', 3600)
+        )
         self.check_promotions.start()
+        self.pay_voice_rewards.start()
+        self.prune_voice_history.start()
+    
+    @property
+    def config(self):
+        return config_service.get()
+    
+    def guild_config(self, guild):
+        """Configuration with the guild's own settings applied"""
+        return config_service.for_guild(guild.id)
+    
+    async def cog_load(self):
+        config_service.subscribe(self.on_config_change)
+        # Every kind, mute and stream toggles change the reward rate
+        self.bot.voice_router.register(self.track_voice_activity)
+        if self.bot.is_ready():
+            await self.rebuild_voice_sessions()
+    
+    def on_config_change(self, config):
+        """Apply a changed reconciliation interval without reloading the cog"""
+        interval = config.get('voice_promotion', {}).get('check_interval', 3600)
+        if interval != self.check_promotions.seconds:
+            self.check_promotions.change_interval(seconds=interval)
+    
+    async def rebuild_voice_sessions(self):
+        """
+        Match the sessions to who is connected to voice right now
+
+        Runs on ready and after a resume: members who joined while the gateway
+        was away get a session, members who left get theirs banked as of now.
+        """
+        now = datetime.now()
+        connected = []
+        connected_ids = set()
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels + guild.stage_channels:
+                for member in channel.members:
+                    connected_ids.add(member.id)
+                    session = self.voice_sessions.get(member.id)
+                    if session is None:
+                        self.voice_sessions[member.id] = (now, channel.id)
+                        self._reward_accrued_at[member.id] = now
+                        self._segment_starts[member.id] = now
+                        connected.append((member.id, guild.id, channel.id))
+                    elif session[1] != channel.id:
+                        # Switched channels while the gateway was away
+                        old_channel = self.bot.get_channel(session[1])
+                        if old_channel:
+                            await self._end_segment(member, old_channel, now)
+                        self.voice_sessions[member.id] = (session[0], channel.id)
+                        self._segment_starts[member.id] = now
+        
+        all_available = all(not guild.unavailable for guild in self.bot.guilds)
+        for member_id in [member_id for member_id in self.voice_sessions if member_id not in connected_ids]:
+            channel = self.bot.get_channel(self.voice_sessions[member_id][1])
+            member = channel.guild.get_member(member_id) if channel else None
+            if member:
+                await self._close_session(member, channel, now)
+            elif all_available:
+                # Channel deleted or member gone, only the minutes can be banked
+                started_at, _ = self.voice_sessions.pop(member_id)
+                self._reward_accrued_at.pop(member_id, None)
+                self._segment_starts.pop(member_id, None)
+                minutes = int((now - started_at).total_seconds() / 60)
+                await self.db.update_voice_activity(member_id, minutes_to_add=minutes)
+        
+        if not self._sessions_reconciled:
+            # First start of this process, close what a crash or restart left open
+            self._sessions_reconciled = True
+            try:
+                closed = await self.db.reconcile_voice_sessions(connected)
+                print(f"🎙️ Voice-Sessions abgeglichen: {closed} offene beendet, {len(connected)} neu gestartet")
+            finally:
+                self._reconcile_done.set()
+        else:
+            # Reconnect, only members that joined while the gateway was away are new
+            for member_id, _, _ in connected:
+                await self.db.update_voice_activity(member_id, session_start=now)
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        await self.rebuild_voice_sessions()
+    
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        # Voice updates missed while disconnected are not replayed
+        await self.rebuild_voice_sessions()
     
-    def cog_unload(self):
+    async def cog_unload(self):
         self.check_promotions.cancel()
+        self.pay_voice_rewards.cancel()
+        self.prune_voice_history.cancel()
+        config_service.unsubscribe(self.on_config_change)
+        self.bot.voice_router.unregister(self.track_voice_activity)
+        
+        # Pay what was accrued so far and make sure buffered voice updates reach the database
+        await self.pay_voice_rewards()
+        await self.db.flush()
     
-    @tasks.loop(seconds=300)  # Check every 5 minutes
-    async def check_promotions(self):
-        """Check for users eligible for promotion"""
-        await self.bot.wait_until_ready()
+    def _reward_rate(self, guild, voice_state):
+        """Spice per hour a member currently earns in voice"""
+        economy = self.guild_config(guild).get('economy', {})
+        rate = economy.get('voice_reward_per_hour', 0)
+        if not rate or voice_state is None or voice_state.channel is None:
+            return 0
+        
+        if economy.get('voice_reward_exclude_afk', True) and voice_state.channel == guild.afk_channel:
+            return 0
+        if economy.get('voice_reward_exclude_deafened', True) and (voice_state.self_deaf or voice_state.deaf):
+            return 0
+        return rate
+    
+    def _accrue(self, member_id, rate, now):
+        """Credit the time since the last accrual at the given hourly rate"""
+        since = self._reward_accrued_at.get(member_id)
+        self._reward_accrued_at[member_id] = now
+        if since and rate:
+            earned = (now - since).total_seconds() / 3600 * rate
+            self._reward_credit[member_id] = self._reward_credit.get(member_id, 0.0) + earned
+    
+    @tasks.loop(minutes=1)
+    async def pay_voice_rewards(self):
+        """Accrue rewards for everyone in voice and pay whole Spice in one bulk update"""
+        now = datetime.now()
+        
+        # Bounds the time a crash can lose or overcount for open sessions,
+        # written only once the previous run's sessions were closed
+        if self._reconcile_done.is_set():
+            try:
+                await self.db.record_heartbeat()
+            except Exception as e:
+                print(f"❌ Fehler beim Schreiben des Heartbeats: {e}")
+        
+        for member_id, (_, channel_id) in list(self.voice_sessions.items()):
+            channel = self.bot.get_channel(channel_id)
+            member = channel.guild.get_member(member_id) if channel else None
+            if member is not None:
+                self._accrue(member_id, self._reward_rate(member.guild, member.voice), now)
+        
+        # Fractions stay as credit for the next tick
+        payouts = [(member_id, int(credit)) for member_id, credit in self._reward_credit.items() if credit >= 1]
+        if not payouts:
+            return
         
-        required_minutes = self.config['voice_promotion']['hours_required'] * 60
+        try:
+            await self.db.bulk_adjust_balances(payouts, reason='voice_reward')
+        except Exception as e:
+            print(f"❌ Fehler beim Auszahlen der Voice-Belohnungen: {e}")
+            return
         
-        # Get all guilds (assuming single guild bot)
-        for guild in self.bot.guilds:
-            rekrut_role_id = self.config['roles']['rekrut']
-            member_role_id = self.config['roles']['member']
-            
-            if not rekrut_role_id or not member_role_id:
-                continue
-            
-            rekrut_role = guild.get_role(rekrut_role_id)
-            member_role = guild.get_role(member_role_id)
+        for member_id, amount in payouts:
+            self._reward_credit[member_id] -= amount
+    
+    @pay_voice_rewards.before_loop
+    async def before_pay_voice_rewards(self):
+        await self.bot.wait_until_ready()
+        await self._reconcile_done.wait()
+    
+    @tasks.loop(hours=24)
+    async def prune_voice_history(self):
+        """Drop raw voice sessions and hourly rollups past the retention period"""
+        keep_days = self.config.get('database', {}).get('voice_history_days', 90)
+        try:
+            await self.db.prune_voice_history(keep_days)
+        except Exception as e:
+            print(f"❌ Fehler beim Bereinigen der Voice-Historie: {e}")
+    
+    @prune_voice_history.before_loop
+    async def before_prune_voice_history(self):
+        await self.bot.wait_until_ready()
+    
+    async def _close_session(self, member, channel, now):
+        """Bank a finished voice session"""
+        self._reward_accrued_at.pop(member.id, None)
+        await self._end_segment(member, channel, now)
+        session = self.voice_sessions.pop(member.id, None)
+        
+        if session:
+            session_duration = now - session[0]
+            session_minutes = int(session_duration.total_seconds() / 60)
             
-            if not rekrut_role or not member_role:
-                continue
+            # Update total minutes and clear session
+            await self.db.update_voice_activity(member.id, minutes_to_add=session_minutes)
             
-            # Check members with Rekrut role
-            for member in rekrut_role.members:
-                voice_data = await self.db.get_voice_activity(member.id)
+            # Promote as soon as the banked time crosses the requirement
+            voice_data = await self.db.get_voice_activity(member.id)
+            total_minutes = voice_data['total_minutes']
+            await self._check_promotion(member, total_minutes - session_minutes, total_minutes)
+    
+    async def _end_segment(self, member, channel, now):
+        """Log the stay in a channel to the session history"""
+        started_at = self._segment_starts.pop(member.id, None)
+        if started_at:
+            await self.db.record_voice_session(member.id, member.guild.id, channel.id, started_at, now)
+    
+    async def recent_voice_seconds(self, member, days=7):
+        """Seconds in voice during the last days, including the running stay"""
+        seconds = await self.db.get_voice_seconds(member.id, days)
+        started_at = self._segment_starts.get(member.id)
+        if started_at:
+            since = datetime.now() - timedelta(days=days)
+            seconds += int((datetime.now() - max(started_at, since)).total_seconds())
+        return seconds
+    
+    async def add_history_fields(self, embed, member):
+        """Add the last-7-days and peak-hour fields to a voice stats embed"""
+        week_minutes = await self.recent_voice_seconds(member, 7) // 60
+        embed.add_field(
+            name="📅 Letzte 7 Tage",
+            value=f"**{week_minutes // 60}h {week_minutes % 60}m**",
+            inline=True
+        )
+        
+        peak_hours = await self.db.get_voice_peak_hours(member.id)
+        if peak_hours:
+            embed.add_field(
+                name="🕒 Aktivste Zeiten (30 Tage)",
+                value="\n".join(f"{hour:02d}:00 - {(hour + 1) % 24:02d}:00 Uhr" for hour, _ in peak_hours),
+                inline=True
+            )
+    
+    @tasks.loop(seconds=3600)  # Reconciliation pass, see check_interval
+    async def check_promotions(self):
+        """Check for users eligible for promotion that were missed when banking"""
+        # Skip this run if the previous sweep is still promoting members
+        if self._promotion_lock.locked():
+            return
+        
+        async with self._promotion_lock:
+            for guild in self.bot.guilds:
+                config = self.guild_config(guild)
+                required_minutes = config['voice_promotion']['hours_required'] * 60
+                rekrut_role_id = config['roles'].get('rekrut')
+                member_role_id = config['roles'].get('member')
+                
+                if not rekrut_role_id or not member_role_id:
+                    continue
+                
+                rekrut_role = guild.get_role(rekrut_role_id)
+                member_role = guild.get_role(member_role_id)
+                
+                if not rekrut_role or not member_role:
+                    continue
+                
+                # One query for every recruit that reached the requirement
+                recruits = {member.id: member for member in rekrut_role.members}
+                if not recruits:
+                    continue
+                
+                eligible = await self.db.get_users_with_voice_minutes(recruits.keys(), required_minutes)
+                
+                # Role changes run concurrently, bounded to stay clear of rate limits
+                semaphore = asyncio.Semaphore(self.promotion_concurrency)
                 
-                if voice_data['total_minutes'] >= required_minutes:
-                    try:
-                        # Remove Rekrut role and add Member role
-                        await member.remove_roles(rekrut_role, reason="Automatische Beförderung nach 24h Voice")
-                        await member.add_roles(member_role, reason="Automatische Beförderung nach 24h Voice")
-                        
-                        # Send congratulations
-                        embed = discord.Embed(
-                            title="🎉 Herzlichen Glückwunsch zur Beförderung!",
-                            description=f"**{member.display_name}** wurde automatisch zum **Member** befördert!\n\n"
-                                       f"Du hast **{voice_data['total_minutes']:,} Minuten** in Voice-Channels verbracht.\n"
-                                       f"Willkommen im inneren Kreis der Gilde!",
-                            color=0x4CAF50,
-                            timestamp=datetime.now()
-                        )
-                        embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
-                        embed.add_field(
-                            name="🏆 Neue Vorteile",
-                            value="• Zugang zu Member-Channels\n"
-                                  "• Höhere Raid-Priorität\n"
-                                  "• Spezielle Member-Belohnungen\n"
-                                  "• Erweiterte Bot-Befehle",
-                            inline=False
-                        )
-                        
-                        # Try to send DM first
-                        try:
-                            await member.send(embed=embed)
-                        except discord.Forbidden:
-                            # If DM fails, send in a general channel
-                            if guild.system_channel:
-                                await guild.system_channel.send(f"{member.mention}", embed=embed)
-                        
-                        # Award promotion bonus
-                        promotion_bonus = 1000
-                        await self.db.update_user_balance(member.id, promotion_bonus)
-                        
-                        print(f"✅ {member.display_name} wurde automatisch zum Member befördert!")
-                        
-                    except discord.HTTPException as e:
-                        print(f"❌ Fehler bei der Beförderung von {member.display_name}: {e}")
+                async def promote(user_id, total_minutes):
+                    async with semaphore:
+                        await self._promote_member(guild, recruits[user_id], rekrut_role, member_role, total_minutes)
+                
+                await asyncio.gather(*(promote(user_id, total_minutes) for user_id, total_minutes in eligible))
+    
+    @check_promotions.before_loop
+    async def before_check_promotions(self):
+        await self.bot.wait_until_ready()
+    
+    async def _promote_member(self, guild, member, rekrut_role, member_role, total_minutes):
+        """Promote a recruit to member and announce it"""
+        if member.id in self._promoting:
+            return
+        
+        self._promoting.add(member.id)
+        try:
+            await self._apply_promotion(guild, member, rekrut_role, member_role, total_minutes)
+        finally:
+            self._promoting.discard(member.id)
+    
+    async def _check_promotion(self, member, previous_minutes, total_minutes):
+        """Promote a recruit right away when banking crossed the requirement"""
+        config = self.guild_config(member.guild)
+        required_minutes = config['voice_promotion']['hours_required'] * 60
+        if previous_minutes >= required_minutes or total_minutes < required_minutes:
+            return
+        
+        rekrut_role_id = config['roles'].get('rekrut')
+        member_role_id = config['roles'].get('member')
+        if not rekrut_role_id or not member_role_id:
+            return
+        
+        rekrut_role = member.guild.get_role(rekrut_role_id)
+        member_role = member.guild.get_role(member_role_id)
+        if not rekrut_role or not member_role:
+            return
+        
+        if rekrut_role in member.roles and member_role not in member.roles:
+            await self._promote_member(member.guild, member, rekrut_role, member_role, total_minutes)
+    
+    async def _apply_promotion(self, guild, member, rekrut_role, member_role, total_minutes):
+        """Swap the roles, notify the member and pay the promotion bonus"""
+        for attempt in range(3):
+            try:
+                # Remove Rekrut role and add Member role
+                await member.remove_roles(rekrut_role, reason="Automatische Beförderung nach 24h Voice")
+                await member.add_roles(member_role, reason="Automatische Beförderung nach 24h Voice")
+                break
+            except discord.HTTPException as e:
+                # Back off and retry when Discord rate limits us
+                if e.status == 429 and attempt < 2:
+                    await asyncio.sleep(getattr(e, 'retry_after', None) or 2 ** attempt)
+                    continue
+                print(f"❌ Fehler bei der Beförderung von {member.display_name}: {e}")
+                return
+        
+        # Send congratulations
+        embed = discord.Embed(
+            title="🎉 Herzlichen Glückwunsch zur Beförderung!",
+            description=f"**{member.display_name}** wurde automatisch zum **Member** befördert!\n\n"
+                       f"Du hast **{total_minutes:,} Minuten** in Voice-Channels verbracht.\n"
+                       f"Willkommen im inneren Kreis der Gilde!",
+            color=0x4CAF50,
+            timestamp=datetime.now()
+        )
+        embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
+        embed.add_field(
+            name="🏆 Neue Vorteile",
+            value="• Zugang zu Member-Channels\n"
+                  "• Höhere Raid-Priorität\n"
+                  "• Spezielle Member-Belohnungen\n"
+                  "• Erweiterte Bot-Befehle",
+            inline=False
+        )
+        
+        # Try to send DM first
+        try:
+            await member.send(embed=embed)
+        except discord.Forbidden:
+            # If DM fails, send in a general channel
+            if guild.system_channel:
+                try:
+                    await guild.system_channel.send(f"{member.mention}", embed=embed)
+                except discord.HTTPException:
+                    pass
+        
+        # Award promotion bonus
+        promotion_bonus = 1000
+        await self.db.update_user_balance(member.id, promotion_bonus, reason='promotion')
+        
+        print(f"✅ {member.display_name} wurde automatisch zum Member befördert!")
     
     @commands.command(name='voice_stats', aliases=['vstats'])
     async def voice_stats(self, ctx, member: discord.Member = None):
@@ -98,7 +396,8 @@ class RolePromotion(commands.Cog):
         hours = total_minutes // 60
         minutes = total_minutes % 60
         
-        required_minutes = self.config['voice_promotion']['hours_required'] * 60
+        hours_required = self.guild_config(target.guild)['voice_promotion']['hours_required']
+        required_minutes = hours_required * 60
         progress = min(100, (total_minutes / required_minutes) * 100)
         remaining_minutes = max(0, required_minutes - total_minutes)
         remaining_hours = remaining_minutes // 60
@@ -121,7 +420,7 @@ class RolePromotion(commands.Cog):
         
         embed.add_field(
             name="🎯 Für Member-Rolle",
-            value=f"**{self.config['voice_promotion']['hours_required']}h** benötigt",
+            value=f"**{hours_required}h** benötigt",
             inline=True
         )
         
@@ -144,10 +443,12 @@ class RolePromotion(commands.Cog):
                 inline=True
             )
         
+        await self.add_history_fields(embed, target)
+        
         # Show current session if in voice
-        if voice_data['session_start']:
-            session_start = datetime.fromisoformat(voice_data['session_start'])
-            session_duration = datetime.now() - session_start
+        session = self.voice_sessions.get(target.id)
+        if session:
+            session_duration = datetime.now() - session[0]
             session_minutes = int(session_duration.total_seconds() / 60)
             
             embed.add_field(
@@ -159,11 +460,11 @@ class RolePromotion(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='force_promote', aliases=['promote'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'force_promote')
     async def force_promote(self, ctx, member: discord.Member):
         """Befördert einen Benutzer manuell zum Member"""
-        rekrut_role_id = self.config['roles']['rekrut']
-        member_role_id = self.config['roles']['member']
+        rekrut_role_id = self.db.get_guild_role_id(ctx.guild.id, 'rekrut')
+        member_role_id = self.db.get_guild_role_id(ctx.guild.id, 'member')
         
         if not rekrut_role_id or not member_role_id:
             await ctx.send("❌ Rollen sind nicht konfiguriert!")
@@ -190,7 +491,7 @@ class RolePromotion(commands.Cog):
             
             # Award promotion bonus
             promotion_bonus = 1000
-            await self.db.update_user_balance(member.id, promotion_bonus)
+            await self.db.update_user_balance(member.id, promotion_bonus, reason='promotion', actor_id=ctx.author.id)
             
             embed = discord.Embed(
                 title="🎉 Manuelle Beförderung",
@@ -228,7 +529,8 @@ class RolePromotion(commands.Cog):
         hours = total_minutes // 60
         minutes = total_minutes % 60
         
-        required_minutes = self.config['voice_promotion']['hours_required'] * 60
+        hours_required = self.guild_config(target.guild)['voice_promotion']['hours_required']
+        required_minutes = hours_required * 60
         progress = min(100, (total_minutes / required_minutes) * 100)
         remaining_minutes = max(0, required_minutes - total_minutes)
         remaining_hours = remaining_minutes // 60
@@ -269,10 +571,12 @@ class RolePromotion(commands.Cog):
                 inline=True
             )
         
+        await self.add_history_fields(embed, target)
+        
         # Show current session if in voice
-        if voice_data['session_start']:
-            session_start = datetime.fromisoformat(voice_data['session_start'])
-            session_duration = datetime.now() - session_start
+        session = self.voice_sessions.get(target.id)
+        if session:
+            session_duration = datetime.now() - session[0]
             session_minutes = int(session_duration.total_seconds() / 60)
             
             embed.add_field(
@@ -287,12 +591,12 @@ class RolePromotion(commands.Cog):
     @app_commands.describe(member="Der Benutzer der befördert werden soll")
     async def force_promote_slash(self, interaction: discord.Interaction, member: discord.Member):
         """Slash command version of force_promote"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'force_promote', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
-        rekrut_role_id = self.config['roles']['rekrut']
-        member_role_id = self.config['roles']['member']
+        rekrut_role_id = self.db.get_guild_role_id(interaction.guild.id, 'rekrut')
+        member_role_id = self.db.get_guild_role_id(interaction.guild.id, 'member')
         
         if not rekrut_role_id or not member_role_id:
             await interaction.response.send_message("❌ Rollen sind nicht konfiguriert!", ephemeral=True)
@@ -315,7 +619,7 @@ class RolePromotion(commands.Cog):
             
             # Award promotion bonus
             promotion_bonus = 1000
-            await self.db.update_user_balance(member.id, promotion_bonus)
+            await self.db.update_user_balance(member.id, promotion_bonus, reason='promotion', actor_id=interaction.user.id)
             
             embed = discord.Embed(
                 title="🎉 Beförderung erfolgreich!",
@@ -343,49 +647,35 @@ class RolePromotion(commands.Cog):
         except discord.HTTPException as e:
             await interaction.response.send_message(f"❌ Fehler bei der Beförderung: {e}", ephemeral=True)
     
-    @commands.Cog.listener()
-    async def on_voice_state_update(self, member, before, after):
+    async def track_voice_activity(self, event):
         """Track voice activity for promotion system"""
-        try:
-            now = datetime.now()
+        member, before, after, now = event.member, event.before, event.after, event.now
+        
+        # Rewards up to now are accrued with the state the member had until now
+        if before.channel:
+            self._accrue(member.id, self._reward_rate(member.guild, before), now)
+        
+        # User joined a voice channel
+        if event.kind == JOIN:
+            self.voice_sessions[member.id] = (now, after.channel.id)
+            self._reward_accrued_at[member.id] = now
+            self._segment_starts[member.id] = now
             
-            # User joined a voice channel
-            if after.channel and not before.channel:
-                await self.db.update_voice_activity(member.id, session_start=now.isoformat())
-                
-                # Award voice reward if economy config exists
-                if 'economy' in self.config and 'voice_reward_per_hour' in self.config['economy']:
-                    voice_reward = self.config['economy']['voice_reward_per_hour'] // 12  # Per 5 minutes
-                    await self.db.update_user_balance(member.id, voice_reward)
-        
-        # User left voice completely
-            elif before.channel and not after.channel:
-                voice_data = await self.db.get_voice_activity(member.id)
-                
-                if voice_data['session_start']:
-                    session_start = datetime.fromisoformat(voice_data['session_start'])
-                    session_duration = now - session_start
-                    session_minutes = int(session_duration.total_seconds() / 60)
-                    
-                    # Update total minutes and clear session
-                    await self.db.update_voice_activity(member.id, minutes_to_add=session_minutes)
+            # Persisted so a restart can close the session
+            await self.db.update_voice_activity(member.id, session_start=now)
+        
+        # User left voice completely, bank the session
+        elif event.kind == LEAVE:
+            await self._close_session(member, before.channel, now)
+        
+        # User switched channels, the session keeps running
+        elif event.kind == SWITCH:
+            session = self.voice_sessions.get(member.id)
+            session_start = session[0] if session else now
+            self.voice_sessions[member.id] = (session_start, after.channel.id)
             
-            # User switched channels (update session start time)
-            elif before.channel and after.channel and before.channel != after.channel:
-                # Calculate time in previous channel
-                voice_data = await self.db.get_voice_activity(member.id)
-                
-                if voice_data['session_start']:
-                    session_start = datetime.fromisoformat(voice_data['session_start'])
-                    session_duration = now - session_start
-                    session_minutes = int(session_duration.total_seconds() / 60)
-                    
-                    # Update minutes and start new session
-                    await self.db.update_voice_activity(member.id, minutes_to_add=session_minutes)
-                    await self.db.update_voice_activity(member.id, session_start=now.isoformat())
-        
-        except Exception as e:
-            print(f"❌ Error in on_voice_state_update: {e}")
+            await self._end_segment(member, before.channel, now)
+            self._segment_starts[member.id] = now
 
 async def setup(bot):
     await bot.add_cog(RolePromotion(bot))
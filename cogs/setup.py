@@ -2,30 +2,21 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
-import os
+from utils.config import config_service
+from database import is_guild_setting
 
 class Setup(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    async def update_config(self, key_path, value):
-        """Update configuration file with new value"""
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        
-        # Navigate to nested key
-        current = config
-        keys = key_path.split('.')
-        for key in keys[:-1]:
-            if key not in current:
-                current[key] = {}
-            current = current[key]
-        
-        current[keys[-1]] = value
+    async def update_config(self, key_path, value, guild=None):
+        """Update a setting, guild sections are stored in the guild's own row"""
+        if guild is not None and is_guild_setting(key_path):
+            await self.bot.db.set_guild_setting(guild.id, key_path, value)
+            return
         
-        with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        # Visible to all cogs at once, written to disk with the next coalesced write
+        config_service.update(key_path, value)
 
     @app_commands.command(name="setup", description="Bot-Konfiguration einrichten")
     @app_commands.describe(
@@ -68,8 +59,7 @@ class Setup(commands.Cog):
 
     async def show_current_config(self, interaction):
         """Show current configuration"""
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = config_service.for_guild(interaction.guild.id)
 
         embed = discord.Embed(
             title="🔧 Aktuelle Bot-Konfiguration",
@@ -116,7 +106,7 @@ class Setup(commands.Cog):
         embed.add_field(
             name="🎖️ Voice Promotion",
             value=f"**Stunden benötigt:** {voice_promo.get('hours_required', 24)}\n"
-                  f"**Check Intervall:** {voice_promo.get('check_interval', 300)}s",
+                  f"**Check Intervall:** {voice_promo.get('check_interval', 3600)}s",
             inline=False
         )
 
@@ -202,8 +192,7 @@ class Setup(commands.Cog):
         view = PermissionSetupView(self)
         
         # Load configured roles
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = config_service.for_guild(interaction.guild.id)
         
         configured_roles = config.get('roles', {})
         
@@ -293,7 +282,7 @@ class DiscordRoleSelectView(discord.ui.View):
             await interaction.response.send_message("❌ Rolle nicht gefunden!", ephemeral=True)
             return
         
-        await self.setup_cog.update_config(f'roles.{self.role_name}', role_id)
+        await self.setup_cog.update_config(f'roles.{self.role_name}', role_id, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Rolle konfiguriert",
@@ -343,7 +332,7 @@ class CustomRoleModal(discord.ui.Modal):
             await interaction.response.send_message("❌ Rolle nicht gefunden!", ephemeral=True)
             return
 
-        await self.setup_cog.update_config(f'roles.{role_name}', role_id)
+        await self.setup_cog.update_config(f'roles.{role_name}', role_id, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Rolle konfiguriert",
@@ -385,7 +374,7 @@ class RoleModal(discord.ui.Modal):
             await interaction.response.send_message("❌ Rolle nicht gefunden!", ephemeral=True)
             return
 
-        await self.setup_cog.update_config(f'roles.{self.role_name}', role_id)
+        await self.setup_cog.update_config(f'roles.{self.role_name}', role_id, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Rolle konfiguriert",
@@ -444,7 +433,7 @@ class ChannelModal(discord.ui.Modal):
             await interaction.response.send_message("❌ Kanal nicht gefunden!", ephemeral=True)
             return
 
-        await self.setup_cog.update_config(f'channels.{self.channel_name}', channel_id)
+        await self.setup_cog.update_config(f'channels.{self.channel_name}', channel_id, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Kanal konfiguriert",
@@ -485,7 +474,7 @@ class VoiceHoursModal(discord.ui.Modal):
             if hours <= 0:
                 raise ValueError()
             
-            await self.setup_cog.update_config('voice_promotion.hours_required', hours)
+            await self.setup_cog.update_config('voice_promotion.hours_required', hours, interaction.guild)
             
             embed = discord.Embed(
                 title="✅ Stunden aktualisiert",
@@ -503,9 +492,9 @@ class VoiceIntervalModal(discord.ui.Modal):
 
         self.interval_input = discord.ui.TextInput(
             label="Check-Intervall in Sekunden",
-            placeholder="300",
+            placeholder="3600",
             required=True,
-            max_length=4
+            max_length=5
         )
         self.add_item(self.interval_input)
 
@@ -515,7 +504,7 @@ class VoiceIntervalModal(discord.ui.Modal):
             if interval < 60:
                 raise ValueError("Intervall muss mindestens 60 Sekunden sein")
             
-            await self.setup_cog.update_config('voice_promotion.check_interval', interval)
+            await self.setup_cog.update_config('voice_promotion.check_interval', interval, interaction.guild)
             
             embed = discord.Embed(
                 title="✅ Intervall aktualisiert",
@@ -555,7 +544,7 @@ class TempVoiceNameModal(discord.ui.Modal):
     async def on_submit(self, interaction: discord.Interaction):
         name = self.name_input.value.strip()
         
-        await self.setup_cog.update_config('temp_voice.default_name', name)
+        await self.setup_cog.update_config('temp_voice.default_name', name, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Standard Name aktualisiert",
@@ -584,7 +573,7 @@ class TempVoiceLimitModal(discord.ui.Modal):
             if limit < 1 or limit > 99:
                 raise ValueError("Limit muss zwischen 1 und 99 sein")
             
-            await self.setup_cog.update_config('temp_voice.default_limit', limit)
+            await self.setup_cog.update_config('temp_voice.default_limit', limit, interaction.guild)
             
             embed = discord.Embed(
                 title="✅ Standard Limit aktualisiert",
@@ -622,8 +611,7 @@ class PermissionSetupView(discord.ui.View):
 
     async def show_current_permissions(self, interaction):
         """Show current permission configuration for all commands"""
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = config_service.for_guild(interaction.guild.id)
         
         permissions = config.get('command_permissions', {})
         
@@ -666,13 +654,13 @@ class IndividualCommandView(discord.ui.View):
         # Liste aller verfügbaren Commands
         self.all_commands = [
             # Economy Commands
-            "balance", "leaderboard", "give", "take",
+            "balance", "leaderboard", "give", "take", "payout",
             # Event System
             "event", "event-edit", "event_info", "crawler", "carrier",
             # Voice Management
             "lockvoice", "unlockvoice", "ragelock", "moveall", "voice_stats",
             # Temp Voice
-            "temp_voice", "temp_limit", "temp_name", "temp_kick",
+            "temp_voice", "temp_limit", "temp_name", "temp_kick", "temp_trigger", "temp_queue",
             # Raid System
             "createraid", "anmelden", "raid_info", "spice_crawl",
             # ModMail
@@ -723,11 +711,10 @@ class IndividualCommandView(discord.ui.View):
         command = select.values[0]
         
         # Zeige Rollen-Auswahl für den gewählten Command
-        view = RoleSelectionView(self.setup_cog, command)
+        view = RoleSelectionView(self.setup_cog, command, interaction.guild)
         
         # Aktuelle Berechtigungen laden
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = config_service.for_guild(interaction.guild.id)
         
         current_permissions = config.get('command_permissions', {}).get(command, ["admin"])
         
@@ -741,21 +728,17 @@ class IndividualCommandView(discord.ui.View):
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
 class RoleSelectionView(discord.ui.View):
-    def __init__(self, setup_cog, command):
+    def __init__(self, setup_cog, command, guild):
         super().__init__(timeout=300)
         self.setup_cog = setup_cog
         self.command = command
         
         # Aktuelle Berechtigungen laden
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = config_service.for_guild(guild.id)
         
         current_permissions = config.get('command_permissions', {}).get(command, ["admin"])
         
         # Get configured roles from config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        
         configured_roles = config.get('roles', {})
         
         # Create role options from configured roles
@@ -791,11 +774,10 @@ class RoleSelectionView(discord.ui.View):
         selected_roles = self.role_select.values
         
         # Update config
-        await self.setup_cog.update_config(f'command_permissions.{self.command}', selected_roles)
+        await self.setup_cog.update_config(f'command_permissions.{self.command}', selected_roles, interaction.guild)
         
         # Get configured roles to show Discord role names
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = config_service.for_guild(interaction.guild.id)
         
         configured_roles = config.get('roles', {})
         
@@ -866,10 +848,10 @@ class CommandPermissionView(discord.ui.View):
         
         # Get commands for this category
         category_commands = {
-            "economy": ["balance", "leaderboard", "give", "take"],
+            "economy": ["balance", "leaderboard", "give", "take", "payout"],
             "events": ["event", "event-edit", "event_info", "crawler", "carrier"],
             "voice": ["lockvoice", "unlockvoice", "ragelock", "moveall", "voice_stats"],
-            "temp_voice": ["temp_voice", "temp_limit", "temp_name", "temp_kick"],
+            "temp_voice": ["temp_voice", "temp_limit", "temp_name", "temp_kick", "temp_trigger", "temp_queue"],
             "raids": ["createraid", "anmelden", "raid_info", "spice_crawl"],
             "modmail": ["modmail", "reply", "close"],
             "promotion": ["force_promote", "voice_stats"]
@@ -879,7 +861,7 @@ class CommandPermissionView(discord.ui.View):
         
         # Update config for each command
         for command in commands:
-            await self.setup_cog.update_config(f'command_permissions.{command}', roles)
+            await self.setup_cog.update_config(f'command_permissions.{command}', roles, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Berechtigungen aktualisiert",
@@ -930,7 +912,7 @@ class CustomPermissionModal(discord.ui.Modal):
             return
         
         # Update config
-        await self.setup_cog.update_config(f'command_permissions.{command}', roles)
+        await self.setup_cog.update_config(f'command_permissions.{command}', roles, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Command Berechtigung gesetzt",
@@ -959,7 +941,7 @@ class ResetPermissionsModal(discord.ui.Modal):
             return
 
         # Reset all command permissions
-        await self.setup_cog.update_config('command_permissions', {})
+        await self.setup_cog.update_config('command_permissions', {}, interaction.guild)
         
         embed = discord.Embed(
             title="✅ Berechtigungen zurückgesetzt",
@@ -1,27 +1,310 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
-import json
-from database import Database
-from utils.permissions import has_role_permission
+from discord.ext import commands, tasks
+import asyncio
+import time
+from typing import Optional
+from datetime import timedelta
+from utils.config import config_service
+from utils.permissions import has_role_permission, permission_resolver
+from utils.voice_router import JOIN, LEAVE, SWITCH
+
+def retry_after(error):
+    """Get the seconds a rate limited request was told to wait, or None"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after  # Longer than the client is willing to wait itself
+    
+    headers = getattr(error.response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+class CreationStats:
+    """Counters of a guild's join-to-create queue"""
+    
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.retries = 0
+        self.deduplicated = 0
+        self.abandoned = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def record_wait(self, seconds):
+        """Count a created channel and the time its member waited for it"""
+        self.created += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+    
+    @property
+    def average_wait(self):
+        return self.total_wait / self.created if self.created else 0.0
 
 class TempVoice(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
+        
+        # Hidden channels created ahead of time, claimed on join
+        self._pools = {}  # (guild_id, category_id) -> [channels]
+        self._fill_tasks = {}  # pool key -> running fill task
+        self._claimed = set()  # ids of pool channels handed out but not moved into yet
+        
+        # Join-to-create requests are worked off one at a time per guild
+        self._create_queues = {}  # guild_id -> {member_id: (trigger, queued_at)}
+        self._create_workers = {}  # guild_id -> task
+        self._creating = {}  # guild_id -> member_id whose channel is being created
+        self._create_stats = {}  # guild_id -> CreationStats
+        
+        # First run right after startup sweeps what was left while offline
+        self.collect_temp_channels.start()
+    
+    async def cog_load(self):
+        self.bot.voice_router.register(self.handle_voice_event, JOIN, LEAVE, SWITCH)
+    
+    async def cog_unload(self):
+        self.bot.voice_router.unregister(self.handle_voice_event)
+        self.collect_temp_channels.cancel()
+        tasks_to_stop = list(self._create_workers.values()) + list(self._fill_tasks.values())
+        for task in tasks_to_stop:
+            task.cancel()
+        await asyncio.gather(*tasks_to_stop, return_exceptions=True)
+    
+    @property
+    def config(self):
+        return config_service.get()
+    
+    def guild_config(self, guild):
+        """Configuration with the guild's own settings applied"""
+        return config_service.for_guild(guild.id)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        # A deleted trigger would otherwise stay in the table
+        if self.db.get_temp_voice_trigger(channel.id):
+            await self.db.remove_temp_voice_trigger(channel.id)
+        
+        pool = self._pools.get(self.pool_key(channel.guild, channel.category))
+        if pool and channel in pool:
+            pool.remove(channel)
+    
+    @tasks.loop(minutes=15)
+    async def collect_temp_channels(self):
+        """Remove temp voice channels that emptied or vanished while nobody was watching"""
+        try:
+            removed, deleted = await self.sweep_temp_channels()
+            if removed or deleted:
+                print(f"🧹 Temp-Voice aufgeräumt: {removed} Einträge entfernt, {deleted} leere Channels gelöscht")
+        except Exception as e:
+            print(f"❌ Fehler beim Aufräumen der Temp-Voice-Channels: {e}")
         
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.fill_pools()
+    
+    @collect_temp_channels.before_loop
+    async def before_collect_temp_channels(self):
+        await self.bot.wait_until_ready()
+    
+    async def sweep_temp_channels(self):
+        """
+        Diff the tracked temp channels against the guilds' channels
+        
+        Rows of channels that no longer exist are deleted in one batch, empty
+        channels that still exist are deleted one by one with a pause in
+        between so a long backlog does not run into the rate limit. Returns
+        (removed rows, deleted channels).
+        """
+        all_available = all(not guild.unavailable for guild in self.bot.guilds)
+        dead, empty = [], []
+        
+        for channel_id, guild_id in await self.db.get_temp_voice_channels():
+            if guild_id is not None:
+                guild = self.bot.get_guild(guild_id)
+                if guild is not None and guild.unavailable:
+                    continue  # Outage, its channels are not cached right now
+                channel = guild.get_channel(channel_id) if guild else None
+            else:
+                # Rows from before guild ids were stored
+                channel = self.bot.get_channel(channel_id)
+                if channel is None and not all_available:
+                    continue
+            
+            if channel is None:
+                dead.append(channel_id)
+            elif not channel.members and not self.is_pooled(channel) and channel.id not in self._claimed:
+                # Unclaimed pool channels of a previous run are reused
+                if self.db.get_temp_voice_owner(channel_id) is None and self.adopt_pool_channel(channel):
+                    continue
+                empty.append(channel)
+        
+        await self.db.remove_temp_voice_channels(dead)
+        
+        grace = discord.utils.utcnow() - timedelta(minutes=1)
+        deleted = 0
+        for channel in empty:
+            # Someone may have joined meanwhile, fresh channels still wait for their owner
+            if channel.members or channel.created_at > grace or self.is_pooled(channel) or channel.id in self._claimed:
+                continue
+            try:
+                await channel.delete(reason="Temporärer Voice-Channel leer")
+                deleted += 1
+            except discord.NotFound:
+                pass  # Already gone
+            except discord.HTTPException as e:
+                print(f"❌ Temp-Voice-Channel {channel.id} konnte nicht gelöscht werden: {e}")
+                continue
+            await self.db.remove_temp_voice_channel(channel.id)
+            await asyncio.sleep(self.guild_config(channel.guild).get('temp_voice', {}).get('delete_delay', 1.0))
         
-        # Channel that triggers temp voice creation
-        self.temp_voice_trigger = None
+        return len(dead), deleted
+    
+    def pool_size(self, guild):
+        return self.guild_config(guild).get('temp_voice', {}).get('pool_size', 0)
+    
+    def pool_key(self, guild, category):
+        return guild.id, category.id if category else None
+    
+    def is_pooled(self, channel):
+        return channel in self._pools.get(self.pool_key(channel.guild, channel.category), ())
+    
+    def adopt_pool_channel(self, channel):
+        """Take a leftover pool channel back into its pool, returns False if the pool is full"""
+        pool = self._pools.setdefault(self.pool_key(channel.guild, channel.category), [])
+        if len(pool) >= self.pool_size(channel.guild):
+            return False
+        pool.append(channel)
+        return True
+    
+    def release_claim(self, channel):
+        """Let the garbage collector see a claimed channel again"""
+        self._claimed.discard(channel.id)
+    
+    def temp_overwrites(self, guild, member):
+        """Permissions of a temp channel owned by member"""
+        return {
+            guild.default_role: discord.PermissionOverwrite(connect=True, view_channel=True),
+            member: discord.PermissionOverwrite(
+                connect=True,
+                manage_channels=True,
+                manage_permissions=True,
+                move_members=True,
+                mute_members=True,
+                deafen_members=True
+            )
+        }
+    
+    def fill_pools(self):
+        """Top up the pool of every trigger category"""
+        for guild in self.bot.guilds:
+            if guild.unavailable or not self.pool_size(guild):
+                continue
+            config = self.guild_config(guild)
+            for trigger in self.db.get_temp_voice_triggers(guild.id):
+                category_id, _, _ = self.trigger_settings(config, trigger)
+                self.replenish_pool(guild, guild.get_channel(category_id) if category_id else None)
+    
+    def replenish_pool(self, guild, category):
+        """Fill a pool up to temp_voice.pool_size in the background"""
+        key = self.pool_key(guild, category)
+        if key in self._fill_tasks or len(self._pools.get(key, ())) >= self.pool_size(guild):
+            return
+        self._fill_tasks[key] = asyncio.create_task(self._fill_pool(guild, category, key))
+    
+    async def _fill_pool(self, guild, category, key):
+        pool = self._pools.setdefault(key, [])
+        try:
+            while len(pool) < self.pool_size(guild):
+                # Hidden until claimed, only the bot can see it
+                channel = await guild.create_voice_channel(
+                    name="➕ Temp Voice",
+                    category=category,
+                    overwrites={
+                        guild.default_role: discord.PermissionOverwrite(view_channel=False, connect=False),
+                        guild.me: discord.PermissionOverwrite(view_channel=True, connect=True, manage_channels=True)
+                    },
+                    reason="Vorbereiteter Temp-Voice-Channel"
+                )
+                await self.db.add_temp_voice_channel(channel.id, None, guild.id)
+                pool.append(channel)
+        except discord.HTTPException as e:
+            print(f"❌ Temp-Voice-Pool konnte nicht aufgefüllt werden: {e}")
+        finally:
+            self._fill_tasks.pop(key, None)
+    
+    async def claim_pooled_channel(self, guild, category, member, name, limit):
+        """
+        Hand a pooled channel to member with a single edit, or None if the pool is empty
+
+        The channel stays in _claimed, out of reach of the garbage collector,
+        until release_claim() is called after the member was moved in.
+        """
+        pool = self._pools.get(self.pool_key(guild, category))
+        channel = None
+        while pool:
+            candidate = pool.pop()
+            self._claimed.add(candidate.id)
+            try:
+                await candidate.edit(
+                    name=name,
+                    user_limit=limit,
+                    overwrites=self.temp_overwrites(guild, member),
+                    reason=f"Auto-Temp Voice für {member}"
+                )
+                await self.db.set_temp_voice_owner(candidate.id, member.id)
+            except discord.NotFound:
+                self._claimed.discard(candidate.id)
+                await self.db.remove_temp_voice_channel(candidate.id)
+                continue
+            except BaseException:
+                # Still hidden and unowned, the next join can claim it again
+                self._claimed.discard(candidate.id)
+                pool.append(candidate)
+                raise
+            channel = candidate
+            break
+        
+        self.replenish_pool(guild, category)
+        return channel
+    
+    def queue_embed(self, guild):
+        """Embed with the join-to-create queue metrics of a guild"""
+        stats = self._create_stats.get(guild.id, CreationStats())
+        depth = len(self._create_queues.get(guild.id, {}))
+        
+        embed = discord.Embed(title="📊 Temp Voice Warteschlange", color=0x4CAF50)
+        embed.add_field(name="Wartend", value=str(depth), inline=True)
+        embed.add_field(name="Maximal wartend", value=str(stats.max_depth), inline=True)
+        embed.add_field(name="Erstellt", value=str(stats.created), inline=True)
+        embed.add_field(name="Wartezeit Ø", value=f"{stats.average_wait:.1f}s", inline=True)
+        embed.add_field(name="Wartezeit max.", value=f"{stats.max_wait:.1f}s", inline=True)
+        embed.add_field(name="Wiederholungen", value=str(stats.retries), inline=True)
+        embed.add_field(name="Fehlgeschlagen", value=str(stats.failed), inline=True)
+        embed.add_field(name="Doppelt beigetreten", value=str(stats.deduplicated), inline=True)
+        embed.add_field(name="Vorher verlassen", value=str(stats.abandoned), inline=True)
+        return embed
+    
+    @commands.command(name='temp_queue')
+    @has_role_permission(['admin', 'moderator'], 'temp_queue')
+    async def temp_queue(self, ctx):
+        """Zeigt die Warteschlange der Join-to-Create Channels"""
+        await ctx.send(embed=self.queue_embed(ctx.guild))
     
     @commands.command(name='set_temp_trigger', aliases=['temp_trigger'])
-    @has_role_permission(['admin', 'moderator'])
-    async def set_temp_trigger(self, ctx, channel: discord.VoiceChannel):
-        """Setzt den Voice-Channel der temporäre Channels erstellt"""
-        self.temp_voice_trigger = channel.id
+    @has_role_permission(['admin', 'moderator'], 'temp_trigger')
+    async def set_temp_trigger(self, ctx, channel: discord.VoiceChannel, category: Optional[discord.CategoryChannel] = None,
+                               limit: Optional[int] = None, *, name=None):
+        """Macht einen Voice-Channel zum Trigger für temporäre Channels"""
+        error = self.validate_trigger(limit, name)
+        if error:
+            await ctx.send(error)
+            return
+        
+        trigger = await self.db.set_temp_voice_trigger(
+            ctx.guild.id, channel.id,
+            category_id=category.id if category else None, name_template=name, user_limit=limit
+        )
         
         embed = discord.Embed(
             title="🔧 Temp Voice Trigger gesetzt",
@@ -29,18 +312,80 @@ class TempVoice(commands.Cog):
                        f"Wenn jemand diesem Channel beitritt, wird automatisch ein privater Channel erstellt.",
             color=0x4CAF50
         )
+        self.add_trigger_fields(embed, ctx.guild, trigger)
         await ctx.send(embed=embed)
     
+    @commands.command(name='remove_temp_trigger', aliases=['untrigger'])
+    @has_role_permission(['admin', 'moderator'], 'temp_trigger')
+    async def remove_temp_trigger(self, ctx, channel: discord.VoiceChannel):
+        """Entfernt einen Trigger für temporäre Channels"""
+        if not await self.db.remove_temp_voice_trigger(channel.id):
+            await ctx.send(f"❌ **{channel.name}** ist kein Temp Voice Trigger!")
+            return
+        
+        await ctx.send(f"✅ **{channel.name}** erstellt keine temporären Channels mehr.")
+    
+    @commands.command(name='temp_triggers', aliases=['triggers'])
+    async def list_temp_triggers(self, ctx):
+        """Zeigt alle Trigger für temporäre Channels"""
+        triggers = self.db.get_temp_voice_triggers(ctx.guild.id)
+        if not triggers:
+            await ctx.send("❌ Es sind keine Temp Voice Trigger eingerichtet!")
+            return
+        
+        config = self.guild_config(ctx.guild)
+        embed = discord.Embed(title="🔧 Temp Voice Trigger", color=0x4CAF50)
+        for trigger in triggers:
+            channel = ctx.guild.get_channel(trigger.channel_id)
+            category_id, name, limit = self.trigger_settings(config, trigger)
+            category = ctx.guild.get_channel(category_id) if category_id else None
+            embed.add_field(
+                name=channel.name if channel else f"Gelöschter Channel ({trigger.channel_id})",
+                value=f"Kategorie: {category.name if category else 'Keine'}\n"
+                      f"Name: {name}\n"
+                      f"Limit: {'unbegrenzt' if limit == 0 else limit}",
+                inline=True
+            )
+        await ctx.send(embed=embed)
+    
+    def validate_trigger(self, limit, name):
+        """Get an error message for invalid trigger settings, or None"""
+        if limit is not None and (limit < 0 or limit > 99):
+            return "❌ Das Limit muss zwischen 0 und 99 liegen! (0 = unbegrenzt)"
+        if name is not None:
+            if len(name) > 50:
+                return "❌ Channel-Name ist zu lang! (Maximum 50 Zeichen)"
+            try:
+                name.format(user='')
+            except (KeyError, IndexError, ValueError, AttributeError):
+                return "❌ Ungültige Namensvorlage! Nur `{user}` wird ersetzt."
+        return None
+    
+    def trigger_settings(self, config, trigger):
+        """Get (category_id, name template, limit) of a trigger with config defaults filled in"""
+        category_id = trigger.category_id or config['channels']['temp_voice_category']
+        name = trigger.name_template or config['temp_voice']['default_name']
+        limit = trigger.user_limit if trigger.user_limit is not None else config['temp_voice']['default_limit']
+        return category_id, name, limit
+    
+    def add_trigger_fields(self, embed, guild, trigger):
+        category_id, name, limit = self.trigger_settings(self.guild_config(guild), trigger)
+        category = guild.get_channel(category_id) if category_id else None
+        embed.add_field(name="Kategorie", value=category.name if category else "Keine", inline=True)
+        embed.add_field(name="Name", value=name, inline=True)
+        embed.add_field(name="Limit", value="unbegrenzt" if limit == 0 else str(limit), inline=True)
+    
     @commands.command(name='temp_voice', aliases=['temp'])
     async def create_temp_voice(self, ctx, *, name=None):
         """Erstellt einen temporären Voice-Channel"""
         guild = ctx.guild
-        category_id = self.config['channels']['temp_voice_category']
+        config = self.guild_config(guild)
+        category_id = config['channels']['temp_voice_category']
         category = guild.get_channel(category_id) if category_id else None
         
         # Generate channel name
         if not name:
-            name = self.config['temp_voice']['default_name'].format(user=ctx.author.display_name)
+            name = config['temp_voice']['default_name'].format(user=ctx.author.display_name)
         
         # Create channel with permissions
         overwrites = {
@@ -59,13 +404,13 @@ class TempVoice(commands.Cog):
             temp_channel = await guild.create_voice_channel(
                 name=name,
                 category=category,
-                user_limit=self.config['temp_voice']['default_limit'],
+                user_limit=config['temp_voice']['default_limit'],
                 overwrites=overwrites,
                 reason=f"Temporärer Voice-Channel von {ctx.author}"
             )
             
             # Add to database
-            await self.db.add_temp_voice_channel(temp_channel.id, ctx.author.id)
+            await self.db.add_temp_voice_channel(temp_channel.id, ctx.author.id, guild.id)
             
             embed = discord.Embed(
                 title="🔊 Temporärer Voice-Channel erstellt",
@@ -94,7 +439,7 @@ class TempVoice(commands.Cog):
             return
         
         channel = ctx.author.voice.channel
-        owner_id = await self.db.get_temp_voice_owner(channel.id)
+        owner_id = self.db.get_temp_voice_owner(channel.id)
         
         if owner_id != ctx.author.id:
             await ctx.send("❌ Du bist nicht der Besitzer dieses Voice-Channels!")
@@ -126,7 +471,7 @@ class TempVoice(commands.Cog):
             return
         
         channel = ctx.author.voice.channel
-        owner_id = await self.db.get_temp_voice_owner(channel.id)
+        owner_id = self.db.get_temp_voice_owner(channel.id)
         
         if owner_id != ctx.author.id:
             await ctx.send("❌ Du bist nicht der Besitzer dieses Voice-Channels!")
@@ -159,7 +504,7 @@ class TempVoice(commands.Cog):
             return
         
         channel = ctx.author.voice.channel
-        owner_id = await self.db.get_temp_voice_owner(channel.id)
+        owner_id = self.db.get_temp_voice_owner(channel.id)
         
         if owner_id != ctx.author.id:
             await ctx.send("❌ Du bist nicht der Besitzer dieses Voice-Channels!")
@@ -182,76 +527,197 @@ class TempVoice(commands.Cog):
         else:
             await ctx.send("❌ Dieser Benutzer ist nicht in deinem Voice-Channel!")
     
-    @commands.Cog.listener()
-    async def on_voice_state_update(self, member, before, after):
-        """Handle temp voice channel creation and deletion"""
-        # Create temp voice when joining trigger channel
-        if after.channel and after.channel.id == self.temp_voice_trigger:
-            # Create temp voice for user
-            guild = member.guild
-            category_id = self.config['channels']['temp_voice_category']
-            category = guild.get_channel(category_id) if category_id else None
-            
-            name = self.config['temp_voice']['default_name'].format(user=member.display_name)
-            
-            overwrites = {
-                guild.default_role: discord.PermissionOverwrite(connect=True, view_channel=True),
-                member: discord.PermissionOverwrite(
-                    connect=True,
-                    manage_channels=True,
-                    manage_permissions=True,
-                    move_members=True,
-                    mute_members=True,
-                    deafen_members=True
-                )
-            }
+    def enqueue_creation(self, member, trigger):
+        """Queue a temp channel for member, a member already waiting or being served is not queued twice"""
+        guild_id = member.guild.id
+        queue = self._create_queues.setdefault(guild_id, {})
+        stats = self._create_stats.setdefault(guild_id, CreationStats())
+        
+        if self._creating.get(guild_id) == member.id:
+            # Rejoined while their channel is being created, it still moves them
+            stats.deduplicated += 1
+        elif member.id in queue:
+            stats.deduplicated += 1
+            queue[member.id] = (trigger, queue[member.id][1])
+        else:
+            queue[member.id] = (trigger, time.monotonic())
+            stats.max_depth = max(stats.max_depth, len(queue))
+        
+        worker = self._create_workers.get(guild_id)
+        if worker is None or worker.done():
+            self._create_workers[guild_id] = asyncio.create_task(self._creation_worker(member.guild))
+    
+    async def _creation_worker(self, guild):
+        """Create queued temp channels of a guild in join order"""
+        queue = self._create_queues[guild.id]
+        stats = self._create_stats[guild.id]
+        
+        while queue:
+            member_id = next(iter(queue))
+            trigger, queued_at = queue.pop(member_id)
+            self._creating[guild.id] = member_id
+            try:
+                await self._serve_member(guild, member_id, trigger, queued_at, stats)
+            finally:
+                self._creating.pop(guild.id, None)
+    
+    async def _serve_member(self, guild, member_id, trigger, queued_at, stats):
+        """Create a queued member's channel and move them into it"""
+        member = guild.get_member(member_id)
+        try:
+            temp_channel = await self._create_with_retry(guild, member_id, trigger, stats)
+        except Exception as e:
+            # One bad request must not stop the queue behind it
+            stats.failed += 1
+            print(f"❌ Temp-Voice für {member or member_id} konnte nicht erstellt werden: {e}")
+            return
+        
+        # Nothing to do for members who left the trigger while waiting
+        if temp_channel is None:
+            stats.abandoned += 1
+            return
+        
+        stats.record_wait(time.monotonic() - queued_at)
+        try:
+            # Fetched again, the member may have rejoined while the channel was created
+            await (guild.get_member(member_id) or member).move_to(temp_channel)
+        except discord.HTTPException:
+            pass  # Left meanwhile, the empty channel is collected later
+        finally:
+            self.release_claim(temp_channel)
+    
+    def waiting_member(self, guild, member_id, trigger):
+        """Get the member if they are still in the trigger channel, else None"""
+        member = guild.get_member(member_id)
+        if not member or not member.voice or not member.voice.channel or member.voice.channel.id != trigger.channel_id:
+            return None
+        return member
+    
+    async def _create_with_retry(self, guild, member_id, trigger, stats):
+        """
+        Claim or create a channel for a waiting member, waiting out rate limits
+
+        Only rate limits are retried, the request was then certainly not
+        applied; a server error may still have created the channel. Returns
+        None once the member is no longer in the trigger channel.
+        """
+        retries = self.guild_config(guild).get('temp_voice', {}).get('create_retries', 3)
+        for attempt in range(retries + 1):
+            member = self.waiting_member(guild, member_id, trigger)
+            if member is None:
+                return None
             
             try:
-                temp_channel = await guild.create_voice_channel(
-                    name=name,
-                    category=category,
-                    user_limit=self.config['temp_voice']['default_limit'],
-                    overwrites=overwrites,
-                    reason=f"Auto-Temp Voice für {member}"
-                )
-                
-                # Add to database
-                await self.db.add_temp_voice_channel(temp_channel.id, member.id)
-                
-                # Move user to new channel
-                await member.move_to(temp_channel)
+                return await self.create_for_trigger(member, trigger)
+            except (discord.RateLimited, discord.HTTPException) as e:
+                if attempt == retries:
+                    raise
+                if not isinstance(e, discord.RateLimited) and e.status != 429:
+                    raise
                 
-            except discord.HTTPException:
-                pass  # Failed to create or move
+                # Wait as long as Discord asks, backing off only when it does not say
+                delay = retry_after(e)
+                if delay is None:
+                    delay = 2 ** attempt
+            
+            stats.retries += 1
+            await asyncio.sleep(delay)
+    
+    async def create_for_trigger(self, member, trigger):
+        """Get member a temp channel for a trigger, from the pool if possible"""
+        guild = member.guild
+        category_id, name, limit = self.trigger_settings(self.guild_config(guild), trigger)
+        category = guild.get_channel(category_id) if category_id else None
+        name = name.format(user=member.display_name)
+        
+        # A pre-warmed channel only needs an edit, creating one is the fallback
+        temp_channel = await self.claim_pooled_channel(guild, category, member, name, limit)
+        if temp_channel is None:
+            temp_channel = await guild.create_voice_channel(
+                name=name,
+                category=category,
+                user_limit=limit,
+                overwrites=self.temp_overwrites(guild, member),
+                reason=f"Auto-Temp Voice für {member}"
+            )
+            
+            # Add to database
+            await self.db.add_temp_voice_channel(temp_channel.id, member.id, guild.id)
+        return temp_channel
+    
+    async def handle_voice_event(self, event):
+        """Handle temp voice channel creation and deletion"""
+        member, before, after = event.member, event.before, event.after
+        
+        # Queue a temp voice when joining a trigger channel
+        trigger = self.db.get_temp_voice_trigger(after.channel.id) if after.channel else None
+        if trigger:
+            self.enqueue_creation(member, trigger)
         
         # Delete empty temp voice channels
-        if before.channel:
-            owner_id = await self.db.get_temp_voice_owner(before.channel.id)
-            if owner_id and len(before.channel.members) == 0:
-                try:
-                    await self.db.remove_temp_voice_channel(before.channel.id)
-                    await before.channel.delete(reason="Temporärer Voice-Channel leer")
-                except discord.HTTPException:
-                    pass  # Failed to delete
-    
-    @app_commands.command(name="set-temp-trigger", description="Setzt den Voice-Channel der temporäre Channels erstellt (Nur Moderatoren)")
-    @app_commands.describe(channel="Der Voice-Channel der als Trigger fungiert")
-    async def set_temp_trigger_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel):
+        if before.channel and self.db.is_temp_voice_channel(before.channel.id) and len(before.channel.members) == 0:
+            try:
+                await self.db.remove_temp_voice_channel(before.channel.id)
+                await before.channel.delete(reason="Temporärer Voice-Channel leer")
+            except discord.HTTPException:
+                pass  # Failed to delete
+    
+    @app_commands.command(name="set-temp-trigger", description="Macht einen Voice-Channel zum Trigger für temporäre Channels (Nur Moderatoren)")
+    @app_commands.describe(
+        channel="Der Voice-Channel der als Trigger fungiert",
+        category="Kategorie der erstellten Channels (optional)",
+        name="Namensvorlage, {user} wird ersetzt (optional)",
+        limit="Benutzerlimit der erstellten Channels, 0 = unbegrenzt (optional)"
+    )
+    async def set_temp_trigger_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel,
+                                     category: discord.CategoryChannel = None, name: str = None, limit: int = None):
         """Slash command version of set_temp_trigger"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'temp_trigger', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
-        self.temp_voice_trigger = channel.id
+        error = self.validate_trigger(limit, name)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
+        
+        trigger = await self.db.set_temp_voice_trigger(
+            interaction.guild.id, channel.id,
+            category_id=category.id if category else None, name_template=name, user_limit=limit
+        )
         
         embed = discord.Embed(
             title="⚙️ Temp Voice Trigger gesetzt",
-            description=f"**{channel.name}** ist jetzt der Trigger für temporäre Voice-Channels!",
+            description=f"**{channel.name}** ist jetzt ein Trigger für temporäre Voice-Channels!",
             color=0x4CAF50
         )
+        self.add_trigger_fields(embed, interaction.guild, trigger)
         embed.set_footer(text=f"Gesetzt von {interaction.user.display_name}")
         await interaction.response.send_message(embed=embed)
     
+    @app_commands.command(name="remove-temp-trigger", description="Entfernt einen Trigger für temporäre Channels (Nur Moderatoren)")
+    @app_commands.describe(channel="Der Trigger-Channel")
+    async def remove_temp_trigger_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel):
+        """Slash command version of remove_temp_trigger"""
+        if not permission_resolver.can_use(interaction.user, 'temp_trigger', ['admin', 'moderator']):
+            await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
+            return
+        
+        if not await self.db.remove_temp_voice_trigger(channel.id):
+            await interaction.response.send_message(f"❌ **{channel.name}** ist kein Temp Voice Trigger!", ephemeral=True)
+            return
+        
+        await interaction.response.send_message(f"✅ **{channel.name}** erstellt keine temporären Channels mehr.")
+    
+    @app_commands.command(name="temp-queue", description="Zeigt die Warteschlange der Join-to-Create Channels (Nur Moderatoren)")
+    async def temp_queue_slash(self, interaction: discord.Interaction):
+        """Slash command version of temp_queue"""
+        if not permission_resolver.can_use(interaction.user, 'temp_queue', ['admin', 'moderator']):
+            await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
+            return
+        
+        await interaction.response.send_message(embed=self.queue_embed(interaction.guild), ephemeral=True)
+    
     @app_commands.command(name="create-temp-voice", description="Erstellt einen temporären Voice-Channel")
     @app_commands.describe(name="Name für den temporären Channel (optional)")
     async def create_temp_voice_slash(self, interaction: discord.Interaction, name: str = None):
@@ -259,12 +725,14 @@ class TempVoice(commands.Cog):
         guild = interaction.guild
         member = interaction.user
         
-        category_id = self.config['channels']['temp_voice_category']
+        config = self.guild_config(guild)
+        
+        category_id = config['channels']['temp_voice_category']
         category = guild.get_channel(category_id) if category_id else None
         
         # Use provided name or default
         if not name:
-            name = self.config['temp_voice']['default_name'].format(user=member.display_name)
+            name = config['temp_voice']['default_name'].format(user=member.display_name)
         
         # Validate channel name
         if len(name) > 50:
@@ -291,7 +759,7 @@ class TempVoice(commands.Cog):
                 reason=f"Temporärer Voice-Channel von {member}"
             )
             
-            await self.db.add_temp_voice_channel(temp_channel.id, member.id)
+            await self.db.add_temp_voice_channel(temp_channel.id, member.id, guild.id)
             
             embed = discord.Embed(
                 title="🎤 Temporärer Voice-Channel erstellt",
@@ -319,7 +787,7 @@ class TempVoice(commands.Cog):
             return
         
         channel = interaction.user.voice.channel
-        owner_id = await self.db.get_temp_voice_owner(channel.id)
+        owner_id = self.db.get_temp_voice_owner(channel.id)
         
         if owner_id != interaction.user.id:
             await interaction.response.send_message("❌ Du bist nicht der Besitzer dieses temporären Channels!", ephemeral=True)
@@ -352,7 +820,7 @@ class TempVoice(commands.Cog):
             return
         
         channel = interaction.user.voice.channel
-        owner_id = await self.db.get_temp_voice_owner(channel.id)
+        owner_id = self.db.get_temp_voice_owner(channel.id)
         
         if owner_id != interaction.user.id:
             await interaction.response.send_message("❌ Du bist nicht der Besitzer dieses temporären Channels!", ephemeral=True)
@@ -386,7 +854,7 @@ class TempVoice(commands.Cog):
             return
         
         channel = interaction.user.voice.channel
-        owner_id = await self.db.get_temp_voice_owner(channel.id)
+        owner_id = self.db.get_temp_voice_owner(channel.id)
         
         if owner_id != interaction.user.id:
             await interaction.response.send_message("❌ Du bist nicht der Besitzer dieses temporären Channels!", ephemeral=True)
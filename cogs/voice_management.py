@@ -1,25 +1,31 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-from database import Database
-from utils.permissions import has_role_permission
+from utils.config import config_service
+from utils.permissions import has_role_permission, permission_resolver
+from utils.voice_router import JOIN, SWITCH
+from database import VOICE_LOCK_KINDS
+
+# Default roles of moveall, shared by the prefix and slash command
+MOVE_ALL_ROLES = ['admin', 'moderator', 'raid_leader']
+
+# Roles that may stay in a rage locked channel
+RAGE_LOCK_BYPASS_ROLES = ['admin', 'moderator', 'raid_leader']
 
 class VoiceManagement(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        
-        # Load config
-        with open('config.json', 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.db = bot.db
         
-        # Set to track locked channels and rage lock channels
-        self.locked_channels = set()
-        self.rage_lock_channels = set()
+        # Rage locked channel ids, persisted in voice_locks and kept in memory by the database
+        self.rage_lock_channels = self.db.get_voice_locks('rage')
+    
+    @property
+    def config(self):
+        return config_service.get()
     
     @commands.command(name='lockvoice', aliases=['voicelock'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'lockvoice')
     async def lock_voice(self, ctx, channel: discord.VoiceChannel = None):
         """Sperrt einen Voice-Channel"""
         if not channel:
@@ -29,9 +35,6 @@ class VoiceManagement(commands.Cog):
                 await ctx.send("❌ Du musst einen Voice-Channel angeben oder dich in einem befinden!")
                 return
         
-        # Add to locked channels
-        self.locked_channels.add(channel.id)
-        
         # Set permissions to deny connect for @everyone
         await channel.set_permissions(
             ctx.guild.default_role, 
@@ -39,6 +42,9 @@ class VoiceManagement(commands.Cog):
             reason=f"Voice-Channel gesperrt von {ctx.author}"
         )
         
+        # Recorded once the channel is actually locked
+        await self.db.add_voice_lock(ctx.guild.id, channel.id, 'lock', ctx.author.id)
+        
         embed = discord.Embed(
             title="🔒 Voice-Channel gesperrt",
             description=f"**{channel.name}** wurde gesperrt!\nNur Benutzer mit besonderen Berechtigungen können beitreten.",
@@ -47,7 +53,7 @@ class VoiceManagement(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='unlockvoice', aliases=['voiceunlock'])
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'unlockvoice')
     async def unlock_voice(self, ctx, channel: discord.VoiceChannel = None):
         """Entsperrt einen Voice-Channel"""
         if not channel:
@@ -57,9 +63,6 @@ class VoiceManagement(commands.Cog):
                 await ctx.send("❌ Du musst einen Voice-Channel angeben oder dich in einem befinden!")
                 return
         
-        # Remove from locked channels
-        self.locked_channels.discard(channel.id)
-        
         # Reset permissions for @everyone
         await channel.set_permissions(
             ctx.guild.default_role, 
@@ -67,6 +70,9 @@ class VoiceManagement(commands.Cog):
             reason=f"Voice-Channel entsperrt von {ctx.author}"
         )
         
+        # Remove from locked channels
+        await self.db.remove_voice_lock(channel.id, 'lock')
+        
         embed = discord.Embed(
             title="🔓 Voice-Channel entsperrt",
             description=f"**{channel.name}** wurde entsperrt!\nAlle können wieder beitreten.",
@@ -75,7 +81,7 @@ class VoiceManagement(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='ragelock')
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'ragelock')
     async def rage_lock(self, ctx, channel: discord.VoiceChannel = None):
         """Aktiviert Rage Lock für einen Voice-Channel (kickt automatisch jeden der beitritt)"""
         if not channel:
@@ -85,12 +91,10 @@ class VoiceManagement(commands.Cog):
                 await ctx.send("❌ Du musst einen Voice-Channel angeben oder dich in einem befinden!")
                 return
         
-        if channel.id in self.rage_lock_channels:
+        if not await self.db.add_voice_lock(ctx.guild.id, channel.id, 'rage', ctx.author.id):
             await ctx.send(f"❌ **{channel.name}** hat bereits Rage Lock aktiviert!")
             return
         
-        self.rage_lock_channels.add(channel.id)
-        
         embed = discord.Embed(
             title="😡 Rage Lock aktiviert",
             description=f"**{channel.name}** hat jetzt Rage Lock!\n"
@@ -100,7 +104,7 @@ class VoiceManagement(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='unragelock')
-    @has_role_permission(['admin', 'moderator'])
+    @has_role_permission(['admin', 'moderator'], 'ragelock')
     async def un_rage_lock(self, ctx, channel: discord.VoiceChannel = None):
         """Deaktiviert Rage Lock für einen Voice-Channel"""
         if not channel:
@@ -110,12 +114,10 @@ class VoiceManagement(commands.Cog):
                 await ctx.send("❌ Du musst einen Voice-Channel angeben oder dich in einem befinden!")
                 return
         
-        if channel.id not in self.rage_lock_channels:
+        if not await self.db.remove_voice_lock(channel.id, 'rage'):
             await ctx.send(f"❌ **{channel.name}** hat kein Rage Lock aktiviert!")
             return
         
-        self.rage_lock_channels.remove(channel.id)
-        
         embed = discord.Embed(
             title="😌 Rage Lock deaktiviert",
             description=f"**{channel.name}** hat kein Rage Lock mehr!\n"
@@ -125,7 +127,7 @@ class VoiceManagement(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name='moveall', aliases=['alle_verschieben'])
-    @has_role_permission(['admin', 'moderator', 'raid_leader'])
+    @has_role_permission(MOVE_ALL_ROLES, 'moveall')
     async def move_all(self, ctx, target_channel: discord.VoiceChannel):
         """Verschiebt alle Benutzer vom aktuellen Voice-Channel zum Ziel-Channel"""
         if not ctx.author.voice or not ctx.author.voice.channel:
@@ -164,13 +166,25 @@ class VoiceManagement(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    async def cog_load(self):
+        self.bot.voice_router.register(self.enforce_rage_lock, JOIN, SWITCH)
+    
+    async def cog_unload(self):
+        self.bot.voice_router.unregister(self.enforce_rage_lock)
+    
     @commands.Cog.listener()
-    async def on_voice_state_update(self, member, before, after):
-        """Handle voice state changes for rage lock and voice activity tracking"""
-        # Handle rage lock
-        if after.channel and after.channel.id in self.rage_lock_channels:
+    async def on_guild_channel_delete(self, channel):
+        # Locks of deleted channels would otherwise stay in the table
+        for kind in VOICE_LOCK_KINDS:
+            if channel.id in self.db.get_voice_locks(kind):
+                await self.db.remove_voice_lock(channel.id, kind)
+    
+    async def enforce_rage_lock(self, event):
+        """Disconnect members entering a rage locked channel"""
+        member, after = event.member, event.after
+        if after.channel.id in self.rage_lock_channels:
             # Check if user has permission to bypass rage lock
-            if not any(role.name.lower() in ['admin', 'moderator', 'raid_leader'] for role in member.roles):
+            if not permission_resolver.has_any(member, RAGE_LOCK_BYPASS_ROLES):
                 try:
                     await member.move_to(None, reason="Rage Lock aktiviert")
                     
@@ -193,7 +207,7 @@ class VoiceManagement(commands.Cog):
     @app_commands.describe(channel="Der Voice-Channel der gesperrt werden soll")
     async def lock_voice_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel = None):
         """Slash command version of lock_voice"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'lockvoice', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -209,6 +223,9 @@ class VoiceManagement(commands.Cog):
         overwrite.connect = False
         await channel.set_permissions(interaction.guild.default_role, overwrite=overwrite)
         
+        # Recorded once the channel is actually locked
+        await self.db.add_voice_lock(interaction.guild.id, channel.id, 'lock', interaction.user.id)
+        
         embed = discord.Embed(
             title="🔒 Voice-Channel gesperrt",
             description=f"**{channel.name}** wurde gesperrt!",
@@ -221,7 +238,7 @@ class VoiceManagement(commands.Cog):
     @app_commands.describe(channel="Der Voice-Channel der entsperrt werden soll")
     async def unlock_voice_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel = None):
         """Slash command version of unlock_voice"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'unlockvoice', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -237,6 +254,8 @@ class VoiceManagement(commands.Cog):
         overwrite.connect = True
         await channel.set_permissions(interaction.guild.default_role, overwrite=overwrite)
         
+        await self.db.remove_voice_lock(channel.id, 'lock')
+        
         embed = discord.Embed(
             title="🔓 Voice-Channel entsperrt",
             description=f"**{channel.name}** wurde entsperrt!",
@@ -249,7 +268,7 @@ class VoiceManagement(commands.Cog):
     @app_commands.describe(channel="Der Voice-Channel für den Rage Lock aktiviert werden soll")
     async def rage_lock_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel = None):
         """Slash command version of rage_lock"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'ragelock', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -260,7 +279,9 @@ class VoiceManagement(commands.Cog):
                 await interaction.response.send_message("❌ Du musst in einem Voice-Channel sein oder einen Channel angeben!", ephemeral=True)
                 return
         
-        self.rage_lock_channels.add(channel.id)
+        if not await self.db.add_voice_lock(interaction.guild.id, channel.id, 'rage', interaction.user.id):
+            await interaction.response.send_message(f"❌ **{channel.name}** hat bereits Rage Lock aktiviert!", ephemeral=True)
+            return
         
         embed = discord.Embed(
             title="😡 Rage Lock aktiviert",
@@ -275,7 +296,7 @@ class VoiceManagement(commands.Cog):
     @app_commands.describe(channel="Der Voice-Channel für den Rage Lock deaktiviert werden soll")
     async def un_rage_lock_slash(self, interaction: discord.Interaction, channel: discord.VoiceChannel = None):
         """Slash command version of un_rage_lock"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'ragelock', ['admin', 'moderator']):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -286,7 +307,9 @@ class VoiceManagement(commands.Cog):
                 await interaction.response.send_message("❌ Du musst in einem Voice-Channel sein oder einen Channel angeben!", ephemeral=True)
                 return
         
-        self.rage_lock_channels.discard(channel.id)
+        if not await self.db.remove_voice_lock(channel.id, 'rage'):
+            await interaction.response.send_message(f"❌ **{channel.name}** hat kein Rage Lock aktiviert!", ephemeral=True)
+            return
         
         embed = discord.Embed(
             title="😌 Rage Lock deaktiviert",
@@ -300,7 +323,7 @@ class VoiceManagement(commands.Cog):
     @app_commands.describe(target_channel="Der Ziel-Voice-Channel")
     async def move_all_slash(self, interaction: discord.Interaction, target_channel: discord.VoiceChannel):
         """Slash command version of move_all"""
-        if not any(role.name.lower() in ['moderator', 'admin'] for role in interaction.user.roles):
+        if not permission_resolver.can_use(interaction.user, 'moveall', MOVE_ALL_ROLES):
             await interaction.response.send_message("❌ Du hast keine Berechtigung für diesen Befehl!", ephemeral=True)
             return
         
@@ -1,124 +1,815 @@
 import aiosqlite
 import asyncio
+import copy
+import sqlite3
+from collections import namedtuple
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import json
+from utils.config import config_service, set_path
+from utils.ranking import BalanceRanking
+
+# A join-to-create channel, None fields fall back to the temp_voice config
+TempVoiceTrigger = namedtuple('TempVoiceTrigger', 'channel_id guild_id category_id name_template user_limit')
+
+# Kinds of voice_locks rows: connect denied for @everyone, or everyone joining is disconnected
+VOICE_LOCK_KINDS = ('lock', 'rage')
+
+# Applied to every pooled connection when it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+# Adds (user_id, delta, earned) to a balance, creating the row if needed
+UPSERT_BALANCE_DELTA = '''
+    INSERT INTO economy (user_id, balance, total_earned)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        balance = balance + excluded.balance,
+        total_earned = total_earned + excluded.total_earned
+'''
+
+INSERT_LEDGER_ENTRY = '''
+    INSERT INTO economy_ledger (user_id, delta, reason, actor_id)
+    VALUES (?, ?, ?, ?)
+'''
+
+UPSERT_BOT_STATE = '''
+    INSERT INTO bot_state (key, value) VALUES (?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+'''
+
+# Configuration sections stored per guild in guild_settings, config.json keeps the rest
+GUILD_SECTIONS = (
+    'roles', 'channels', 'voice_promotion', 'temp_voice',
+    'command_permissions', 'economy', 'permissions',
+)
+
+# Bot-wide keys inside guild sections, e.g. the interval of the shared promotion loop
+GLOBAL_KEYS = ('voice_promotion.check_interval',)
+
+def is_guild_setting(key_path):
+    """Check if a (dot separated) key belongs to the per-guild settings"""
+    return key_path.split('.', 1)[0] in GUILD_SECTIONS and key_path not in GLOBAL_KEYS
+
+GUILD_SETTINGS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id INTEGER NOT NULL,
+        section TEXT NOT NULL,
+        value TEXT NOT NULL,
+        replaces INTEGER NOT NULL DEFAULT 0,
+        revision INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (guild_id, section)
+    )
+'''
+
+# Every write takes the next revision, so readers can poll for changed rows.
+# A row that replaces its section hides the config.json keys it does not have,
+# otherwise its keys are laid over the config.json section.
+UPSERT_GUILD_SETTING = '''
+    INSERT INTO guild_settings (guild_id, section, value, replaces, revision, updated_at)
+    VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(revision), 0) + 1 FROM guild_settings), CURRENT_TIMESTAMP)
+    ON CONFLICT(guild_id, section) DO UPDATE SET
+        value = excluded.value,
+        replaces = excluded.replaces,
+        revision = excluded.revision,
+        updated_at = excluded.updated_at
+'''
 
 class Database:
-    def __init__(self, db_path="guild_bot.db"):
+    def __init__(self, db_path="guild_bot.db", pool_size=4, flush_interval=2.0, flush_batch_size=100):
         self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        
+        # Long-lived connections shared by all cogs
+        self._pool = None
+        self._connections = []
+        self._pool_lock = asyncio.Lock()
+        
+        # Write-behind buffers for economy and voice updates, coalesced per user
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._pending_balances = {}  # user_id -> [delta, earned]
+        self._pending_ledger = []  # (user_id, delta, reason, actor_id)
+        self._pending_voice = {}  # user_id -> [minutes_to_add, session_start]
+        self._pending_sessions = []  # (user_id, guild_id, channel_id, started_at, ended_at)
+        self._pending_ops = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_seq = 0
+        self._flush_task = None
+        
+        # Leaderboard served from memory, kept in step with balance updates
+        self._ranking = BalanceRanking()
+        
+        # Guild settings cache, refreshed when another process writes a row
+        self._guild_settings = {}  # guild_id -> {section: value}
+        self._replaced_sections = {}  # guild_id -> sections that replace the config.json section
+        self._settings_revision = 0
+        
+        # Temp voice channel owners, kept in step with the temp_voice_channels table
+        self._temp_voice_owners = {}  # channel_id -> owner_id
+        self._temp_voice_triggers = {}  # channel_id -> TempVoiceTrigger
+        
+        # Locked voice channels by kind, kept in step with the voice_locks table
+        self._voice_locks = {kind: set() for kind in VOICE_LOCK_KINDS}
+    
+    async def connect(self):
+        """Open the connection pool"""
+        async with self._pool_lock:
+            if self._pool is not None:
+                return
+            
+            pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                connection = await aiosqlite.connect(self.db_path)
+                for pragma in CONNECTION_PRAGMAS:
+                    await connection.execute(pragma)
+                self._connections.append(connection)
+                pool.put_nowait(connection)
+            self._pool = pool
+    
+    async def close(self):
+        """Flush pending writes and close all pooled connections"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        
+        if self._pool is not None:
+            await self.flush()
+        
+        async with self._pool_lock:
+            for connection in self._connections:
+                await connection.close()
+            self._connections = []
+            self._pool = None
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a connection from the pool"""
+        if self._pool is None:
+            await self.connect()
+        
+        pool = self._pool
+        connection = await pool.get()
+        try:
+            yield connection
+        finally:
+            # Never hand a connection with an open transaction back to the pool
+            if connection.in_transaction:
+                await connection.rollback()
+            pool.put_nowait(connection)
     
     async def initialize(self):
         """Initialize database tables"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Economy table
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS economy (
-                    user_id INTEGER PRIMARY KEY,
-                    balance INTEGER DEFAULT 0,
-                    last_daily TIMESTAMP,
-                    total_earned INTEGER DEFAULT 0
-                )
-            ''')
+        await self.connect()
+        async with self.acquire() as db:
+            await migrate(db)
             
-            # Voice activity tracking
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS voice_activity (
-                    user_id INTEGER PRIMARY KEY,
-                    total_minutes INTEGER DEFAULT 0,
-                    session_start TIMESTAMP,
-                    last_update TIMESTAMP
-                )
-            ''')
+            cursor = await db.execute("SELECT channel_id, owner_id FROM temp_voice_channels")
+            self._temp_voice_owners = dict(await cursor.fetchall())
             
-            # Raid registrations
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS raid_registrations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    raid_id TEXT,
-                    user_id INTEGER,
-                    username TEXT,
-                    role TEXT,
-                    notes TEXT,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(raid_id, user_id)
-                )
+            cursor = await db.execute('''
+                SELECT channel_id, guild_id, category_id, name_template, user_limit
+                FROM temp_voice_triggers
             ''')
+            self._temp_voice_triggers = {row[0]: TempVoiceTrigger(*row) for row in await cursor.fetchall()}
             
-            # Temporary voice channels
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS temp_voice_channels (
-                    channel_id INTEGER PRIMARY KEY,
-                    owner_id INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            cursor = await db.execute("SELECT channel_id, kind FROM voice_locks")
+            for locks in self._voice_locks.values():
+                locks.clear()
+            for channel_id, kind in await cursor.fetchall():
+                self._voice_locks[kind].add(channel_id)
+        
+        await self.load_ranking()
+        await self.refresh_guild_settings()
+        
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def load_ranking(self):
+        """Rebuild the leaderboard from the stored balances and the buffered changes"""
+        # initialize runs again on reconnects, with changes still waiting for a
+        # flush. Holding the flush lock keeps a batch from being half written.
+        async with self._flush_lock:
+            async with self.acquire() as db:
+                # Walks idx_economy_balance, later changes are applied by update_user_balance
+                cursor = await db.execute('''
+                    SELECT user_id, balance FROM economy
+                    WHERE balance > 0
+                    ORDER BY balance DESC, user_id
+                ''')
+                rows = await cursor.fetchall()
             
-            # Modmail threads
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS modmail_threads (
-                    user_id INTEGER PRIMARY KEY,
-                    channel_id INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'open'
-                )
-            ''')
+            self._ranking.load(rows)
+            for user_id, (delta, _) in self._pending_balances.items():
+                self._ranking.apply(user_id, delta)
+    
+    async def _flush_loop(self):
+        """Periodically write buffered updates to disk"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Fehler beim Schreiben gepufferter Datenbank-Updates: {e}")
             
+            # Pick up settings saved by the web interface
+            try:
+                await self.refresh_guild_settings()
+            except Exception as e:
+                print(f"❌ Fehler beim Laden der Server-Einstellungen: {e}")
+    
+    async def refresh_guild_settings(self):
+        """Load guild settings rows written since the last refresh"""
+        async with self.acquire() as db:
+            cursor = await db.execute('''
+                SELECT guild_id, section, value, replaces, revision FROM guild_settings
+                WHERE revision > ?
+            ''', (self._settings_revision,))
+            rows = await cursor.fetchall()
+        
+        changed = set()
+        for guild_id, section, value, replaces, revision in rows:
+            self._store_guild_section(guild_id, section, json.loads(value), replaces)
+            self._settings_revision = max(self._settings_revision, revision)
+            changed.add(guild_id)
+        
+        for guild_id in changed:
+            config_service.set_guild_overrides(
+                guild_id, self._guild_settings[guild_id], self._replaced_sections[guild_id]
+            )
+    
+    def _store_guild_section(self, guild_id, section, value, replaces):
+        sections = dict(self._guild_settings.get(guild_id, {}))
+        sections[section] = value
+        self._guild_settings[guild_id] = sections
+        
+        replaced = set(self._replaced_sections.get(guild_id, ()))
+        if replaces:
+            replaced.add(section)
+        else:
+            replaced.discard(section)
+        self._replaced_sections[guild_id] = frozenset(replaced)
+    
+    def get_guild_settings(self, guild_id):
+        """Get the sections stored for a guild (shared, do not modify)"""
+        return self._guild_settings.get(guild_id, {})
+    
+    def get_guild_setting(self, guild_id, key_path, default=None):
+        """Get a (dot separated) setting of a guild, falling back to config.json"""
+        value = config_service.for_guild(guild_id)
+        for key in key_path.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+    
+    def get_guild_role_id(self, guild_id, role_name):
+        """Get the configured role id of a guild, or None"""
+        role_id = self.get_guild_setting(guild_id, f'roles.{role_name}')
+        return int(role_id) if role_id else None
+    
+    def get_guild_channel_id(self, guild_id, channel_name):
+        """Get the configured channel id of a guild, or None"""
+        channel_id = self.get_guild_setting(guild_id, f'channels.{channel_name}')
+        return int(channel_id) if channel_id else None
+    
+    async def set_guild_setting(self, guild_id, key_path, value):
+        """
+        Set a (dot separated) setting of a guild, only its section row is rewritten
+
+        Setting a whole section replaces the config.json section, so keys left
+        out are removed for the guild. Setting a single key keeps the others.
+        """
+        section, _, rest = key_path.partition('.')
+        if section not in GUILD_SECTIONS:
+            raise ValueError(f"{section} ist keine Server-Einstellung")
+        
+        if rest:
+            # Only the guild's own keys are stored, the rest keeps following config.json
+            section_value = copy.deepcopy(self._guild_settings.get(guild_id, {}).get(section, {}))
+            set_path(section_value, rest, value)
+            replaces = section in self._replaced_sections.get(guild_id, ())
+        else:
+            section_value = value
+            replaces = True
+        
+        async with self.acquire() as db:
+            await db.execute(UPSERT_GUILD_SETTING, (guild_id, section, json.dumps(section_value), int(replaces)))
             await db.commit()
+        
+        self._store_guild_section(guild_id, section, section_value, replaces)
+        config_service.set_guild_overrides(
+            guild_id, self._guild_settings[guild_id], self._replaced_sections[guild_id]
+        )
+    
+    async def _queued_write(self):
+        """
+        Account for a buffered write and flush early once the batch is full
+
+        The caller's update is already buffered at this point, so a failed
+        early flush is only logged: the batch stays buffered and is retried
+        by the flush loop. Raising would make callers retry an update that
+        is still going to be applied.
+        """
+        self._pending_ops += 1
+        if self._pending_ops >= self.flush_batch_size:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Fehler beim Schreiben gepufferter Datenbank-Updates: {e}")
+    
+    async def flush(self):
+        """Write all buffered economy and voice updates in a single transaction"""
+        async with self._flush_lock:
+            if not self._pending_balances and not self._pending_voice and not self._pending_sessions:
+                return
+            
+            # Readers retry if a flush started while they were reading
+            self._flush_seq += 1
+            
+            balances, self._pending_balances = self._pending_balances, {}
+            ledger, self._pending_ledger = self._pending_ledger, []
+            voice, self._pending_voice = self._pending_voice, {}
+            sessions, self._pending_sessions = self._pending_sessions, []
+            self._pending_ops = 0
+            
+            try:
+                async with self.acquire() as db:
+                    await db.executemany(UPSERT_BALANCE_DELTA, [
+                        (user_id, delta, earned) for user_id, (delta, earned) in balances.items()
+                    ])
+                    
+                    # Every change to a balance above is recorded in the same transaction
+                    await db.executemany(INSERT_LEDGER_ENTRY, ledger)
+                    
+                    await db.executemany('''
+                        INSERT INTO voice_activity (user_id, total_minutes, session_start, last_update)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(user_id) DO UPDATE SET
+                            total_minutes = total_minutes + excluded.total_minutes,
+                            session_start = excluded.session_start,
+                            last_update = excluded.last_update
+                    ''', [(user_id, minutes, session_start) for user_id, (minutes, session_start) in voice.items()])
+                    
+                    if sessions:
+                        await self._write_voice_sessions(db, sessions)
+                    
+                    await db.commit()
+            except Exception:
+                # Put the batch back so the next flush retries it
+                self._pending_ledger = ledger + self._pending_ledger
+                self._pending_sessions = sessions + self._pending_sessions
+                for user_id, (delta, earned) in balances.items():
+                    entry = self._pending_balances.setdefault(user_id, [0, 0])
+                    entry[0] += delta
+                    entry[1] += earned
+                for user_id, (minutes, session_start) in voice.items():
+                    entry = self._pending_voice.get(user_id)
+                    if entry:
+                        entry[0] += minutes
+                    else:
+                        self._pending_voice[user_id] = [minutes, session_start]
+                raise
+    
+    async def _stable_read(self, read):
+        """Run a read that merges buffered writes without racing a flush"""
+        while True:
+            if self._flush_lock.locked():
+                async with self._flush_lock:
+                    pass
+            
+            seq = self._flush_seq
+            result = await read()
+            if seq == self._flush_seq:
+                return result
     
     async def get_user_balance(self, user_id):
         """Get user's economy balance"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def read():
+            async with self.acquire() as db:
+                cursor = await db.execute(
+                    "SELECT balance FROM economy WHERE user_id = ?", (user_id,)
+                )
+                result = await cursor.fetchone()
+            
+            pending = self._pending_balances.get(user_id)
+            return (result[0] if result else 0) + (pending[0] if pending else 0)
+        
+        return await self._stable_read(read)
+    
+    async def update_user_balance(self, user_id, amount, reason=None, actor_id=None):
+        """
+        Update user's balance and log it to the ledger (buffered, written by the next flush)
+
+        Negative amounts are buffered under the flush lock, so they cannot
+        land between the balance check and the update of a running debit.
+        """
+        if amount == 0:
+            return
+        
+        if amount < 0:
+            async with self._flush_lock:
+                self._buffer_balance(user_id, amount, reason, actor_id)
+        else:
+            self._buffer_balance(user_id, amount, reason, actor_id)
+        await self._queued_write()
+    
+    def _buffer_balance(self, user_id, amount, reason, actor_id):
+        entry = self._pending_balances.setdefault(user_id, [0, 0])
+        entry[0] += amount
+        entry[1] += max(0, amount)
+        self._pending_ledger.append((user_id, amount, reason, actor_id))
+        self._ranking.apply(user_id, amount)
+    
+    async def debit_if_sufficient(self, user_id, amount, reason=None, actor_id=None):
+        """
+        Take amount from a balance only if it covers it
+
+        Check and update are a single conditional UPDATE, so concurrent
+        debits can never overdraw. Returns (debited, balance) with the new
+        balance, or the unchanged one when it was not sufficient.
+        """
+        async with self._debit(user_id, amount, reason, actor_id) as (db, debited, balance):
+            if debited:
+                await db.commit()
+        if debited:
+            self._ranking.apply(user_id, -amount)
+        return debited, balance
+    
+    async def transfer(self, from_user_id, to_user_id, amount, reason=None, actor_id=None):
+        """
+        Move amount between two balances in one transaction
+
+        Returns (transferred, balance of the sender) like debit_if_sufficient.
+        """
+        async with self._debit(from_user_id, amount, reason, actor_id) as (db, debited, balance):
+            if debited:
+                await db.execute('''
+                    INSERT INTO economy (user_id, balance) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET balance = balance + excluded.balance
+                ''', (to_user_id, amount))
+                await db.execute(INSERT_LEDGER_ENTRY, (to_user_id, amount, reason, actor_id))
+                await db.commit()
+        if debited:
+            self._ranking.apply(from_user_id, -amount)
+            self._ranking.apply(to_user_id, amount)
+        return debited, balance
+    
+    @asynccontextmanager
+    async def _debit(self, user_id, amount, reason, actor_id):
+        if amount <= 0:
+            raise ValueError("Der Betrag muss positiv sein")
+        
+        # Debits are serialized with flushes, buffered deltas stay in the buffer
+        async with self._flush_lock:
+            async with self.acquire() as db:
+                pending = self._pending_balances.get(user_id)
+                pending_delta = pending[0] if pending else 0
+                
+                if pending:
+                    # The row may only exist in the buffer so far
+                    await db.execute(
+                        "INSERT OR IGNORE INTO economy (user_id, balance) VALUES (?, 0)", (user_id,)
+                    )
+                
+                cursor = await db.execute('''
+                    UPDATE economy SET balance = balance - ?
+                    WHERE user_id = ? AND balance + ? >= ?
+                    RETURNING balance
+                ''', (amount, user_id, pending_delta, amount))
+                row = await cursor.fetchone()
+                
+                if row:
+                    await db.execute(INSERT_LEDGER_ENTRY, (user_id, -amount, reason, actor_id))
+                    yield db, True, row[0] + pending_delta
+                else:
+                    cursor = await db.execute(
+                        "SELECT balance FROM economy WHERE user_id = ?", (user_id,)
+                    )
+                    current = await cursor.fetchone()
+                    yield db, False, (current[0] if current else 0) + pending_delta
+    
+    async def bulk_adjust_balances(self, adjustments, reason=None, actor_id=None, payout_id=None, force=False):
+        """
+        Apply (user_id, delta) adjustments with their ledger entries in one transaction
+
+        With a payout_id the adjustments are applied only once per id: a
+        repeat returns None and changes nothing unless force is set.
+        """
+        adjustments = [(user_id, delta) for user_id, delta in adjustments if delta]
+        if not adjustments:
+            return 0
+        
+        async with self.acquire() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            if payout_id is not None:
+                cursor = await db.execute('''
+                    INSERT INTO payouts (payout_id, recipients, total, actor_id) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (payout_id) DO UPDATE SET
+                        recipients = excluded.recipients,
+                        total = payouts.total + excluded.total,
+                        actor_id = excluded.actor_id,
+                        paid_at = CURRENT_TIMESTAMP,
+                        times = payouts.times + 1
+                    WHERE ?
+                ''', (payout_id, len(adjustments), sum(delta for _, delta in adjustments), actor_id, force))
+                if cursor.rowcount == 0:
+                    await db.rollback()
+                    return None
+            
+            await db.executemany(UPSERT_BALANCE_DELTA, [
+                (user_id, delta, max(0, delta)) for user_id, delta in adjustments
+            ])
+            await db.executemany(INSERT_LEDGER_ENTRY, [
+                (user_id, delta, reason, actor_id) for user_id, delta in adjustments
+            ])
+            await db.commit()
+        
+        for user_id, delta in adjustments:
+            self._ranking.apply(user_id, delta)
+        return len(adjustments)
+    
+    async def get_payout(self, payout_id):
+        """Get (recipients, total, actor_id, paid_at, times) of a payout, or None"""
+        async with self.acquire() as db:
             cursor = await db.execute(
-                "SELECT balance FROM economy WHERE user_id = ?", (user_id,)
+                "SELECT recipients, total, actor_id, paid_at, times FROM payouts WHERE payout_id = ?", (payout_id,)
             )
-            result = await cursor.fetchone()
-            return result[0] if result else 0
+            return await cursor.fetchone()
     
-    async def update_user_balance(self, user_id, amount):
-        """Update user's balance"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def compact_ledger(self, older_than_days=90):
+        """
+        Fold old ledger entries into one snapshot entry per user
+
+        The sum per user stays the same, so the ledger keeps matching the
+        balances while old history no longer grows without bound.
+        Returns the number of removed entries.
+        """
+        await self.flush()
+        async with self.acquire() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cursor = await db.execute(
+                "SELECT datetime('now', ?), MAX(id) FROM economy_ledger",
+                (f'-{int(older_than_days)} days',)
+            )
+            cutoff, last_id = await cursor.fetchone()
+            if last_id is None:
+                await db.rollback()
+                return 0
+            
+            # Entries are selected by age, not id: snapshots get new ids but keep
+            # the time of what they fold, so ids say nothing about age. Limiting
+            # the delete to ids up to last_id keeps the snapshots inserted here.
             await db.execute('''
-                INSERT OR REPLACE INTO economy (user_id, balance, total_earned)
-                VALUES (?, 
-                    COALESCE((SELECT balance FROM economy WHERE user_id = ?), 0) + ?,
-                    COALESCE((SELECT total_earned FROM economy WHERE user_id = ?), 0) + ?)
-            ''', (user_id, user_id, amount, user_id, max(0, amount)))
+                INSERT INTO economy_ledger (user_id, delta, reason, created_at)
+                SELECT user_id, SUM(delta), 'snapshot', MAX(created_at)
+                FROM economy_ledger
+                WHERE created_at < ?
+                GROUP BY user_id
+                HAVING COUNT(*) > 1
+            ''', (cutoff,))
+            
+            cursor = await db.execute('''
+                DELETE FROM economy_ledger
+                WHERE id <= ? AND created_at < ? AND user_id IN (
+                    SELECT user_id FROM economy_ledger
+                    WHERE id <= ? AND created_at < ?
+                    GROUP BY user_id
+                    HAVING COUNT(*) > 1
+                )
+            ''', (last_id, cutoff, last_id, cutoff))
+            removed = cursor.rowcount
             await db.commit()
+            return removed
+    
+    def get_leaderboard(self, limit=10):
+        """Get the top (user_id, balance) entries with a positive balance"""
+        return self._ranking.top(limit)
+    
+    def get_leaderboard_page(self, cursor=None, limit=10, before=False):
+        """
+        Get (position, entries) of a leaderboard page
+
+        cursor is a (user_id, balance) entry of the current page, the page
+        after it is returned, or the one before it when before is set.
+        """
+        if before:
+            return self._ranking.page_before(cursor, limit)
+        return self._ranking.page_after(cursor, limit)
+    
+    def get_leaderboard_size(self):
+        """Get the number of users with a positive balance"""
+        return len(self._ranking)
+    
+    def get_balance_rank(self, user_id):
+        """Get (rank, number of ranked users), rank is None without a positive balance"""
+        return self._ranking.rank(user_id), len(self._ranking)
     
     async def get_voice_activity(self, user_id):
         """Get user's voice activity"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT total_minutes, session_start FROM voice_activity WHERE user_id = ?", 
-                (user_id,)
-            )
-            result = await cursor.fetchone()
-            if result:
-                return {"total_minutes": result[0], "session_start": result[1]}
-            return {"total_minutes": 0, "session_start": None}
+        async def read():
+            async with self.acquire() as db:
+                cursor = await db.execute(
+                    "SELECT total_minutes, session_start FROM voice_activity WHERE user_id = ?", 
+                    (user_id,)
+                )
+                result = await cursor.fetchone()
+            
+            voice_data = {"total_minutes": result[0], "session_start": result[1]} if result \
+                else {"total_minutes": 0, "session_start": None}
+            
+            pending = self._pending_voice.get(user_id)
+            if pending:
+                voice_data["total_minutes"] += pending[0]
+                voice_data["session_start"] = pending[1]
+            return voice_data
+        
+        return await self._stable_read(read)
     
     async def update_voice_activity(self, user_id, minutes_to_add=0, session_start=None):
-        """Update user's voice activity"""
-        async with aiosqlite.connect(self.db_path) as db:
-            if session_start:
-                await db.execute('''
-                    INSERT OR REPLACE INTO voice_activity (user_id, total_minutes, session_start, last_update)
-                    VALUES (?, 
-                        COALESCE((SELECT total_minutes FROM voice_activity WHERE user_id = ?), 0),
-                        ?, CURRENT_TIMESTAMP)
-                ''', (user_id, user_id, session_start))
-            else:
-                await db.execute('''
-                    INSERT OR REPLACE INTO voice_activity (user_id, total_minutes, session_start, last_update)
-                    VALUES (?, 
-                        COALESCE((SELECT total_minutes FROM voice_activity WHERE user_id = ?), 0) + ?,
-                        NULL, CURRENT_TIMESTAMP)
-                ''', (user_id, user_id, minutes_to_add))
+        """Update user's voice activity (buffered, written by the next flush)"""
+        entry = self._pending_voice.setdefault(user_id, [0, None])
+        if session_start:
+            # Starting a session keeps the banked minutes untouched
+            entry[1] = _timestamp(session_start) if isinstance(session_start, datetime) else session_start
+        else:
+            entry[0] += minutes_to_add
+            entry[1] = None
+        await self._queued_write()
+    
+    async def record_voice_session(self, user_id, guild_id, channel_id, started_at, ended_at):
+        """Log a finished stay in a voice channel (buffered, written by the next flush)"""
+        if ended_at <= started_at:
+            return
+        self._pending_sessions.append((user_id, guild_id, channel_id, started_at, ended_at))
+        await self._queued_write()
+    
+    async def _write_voice_sessions(self, db, sessions):
+        # Rollups are updated incrementally, so window queries never read raw sessions
+        hourly = {}
+        daily = {}
+        for user_id, _, _, started_at, ended_at in sessions:
+            for hour, seconds in _split_by_hour(started_at, ended_at):
+                hour_key = (user_id, hour.strftime('%Y-%m-%d %H:00'))
+                day_key = (user_id, hour.strftime('%Y-%m-%d'))
+                hourly[hour_key] = hourly.get(hour_key, 0) + seconds
+                daily[day_key] = daily.get(day_key, 0) + seconds
+        
+        await db.executemany('''
+            INSERT INTO voice_sessions (user_id, guild_id, channel_id, started_at, ended_at, seconds)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (user_id, guild_id, channel_id, _timestamp(started_at), _timestamp(ended_at),
+             int((ended_at - started_at).total_seconds()))
+            for user_id, guild_id, channel_id, started_at, ended_at in sessions
+        ])
+        await db.executemany('''
+            INSERT INTO voice_rollup_hourly (user_id, hour, seconds) VALUES (?, ?, ?)
+            ON CONFLICT(user_id, hour) DO UPDATE SET seconds = seconds + excluded.seconds
+        ''', [(user_id, hour, int(seconds)) for (user_id, hour), seconds in hourly.items()])
+        await db.executemany('''
+            INSERT INTO voice_rollup_daily (user_id, day, seconds) VALUES (?, ?, ?)
+            ON CONFLICT(user_id, day) DO UPDATE SET seconds = seconds + excluded.seconds
+        ''', [(user_id, day, int(seconds)) for (user_id, day), seconds in daily.items()])
+    
+    async def get_voice_seconds(self, user_id, days):
+        """
+        Get the seconds a user spent in voice during the last days
+
+        Whole days come from the daily rollup and the partial first day from
+        the hourly one, so the window starts at a full hour.
+        """
+        now = datetime.now()
+        since = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+        first_full_day = since.date() + timedelta(days=1)
+        
+        async def read():
+            async with self.acquire() as db:
+                cursor = await db.execute('''
+                    SELECT
+                        (SELECT COALESCE(SUM(seconds), 0) FROM voice_rollup_daily
+                         WHERE user_id = ? AND day >= ?)
+                        +
+                        (SELECT COALESCE(SUM(seconds), 0) FROM voice_rollup_hourly
+                         WHERE user_id = ? AND hour >= ? AND hour < ?)
+                ''', (
+                    user_id, first_full_day.isoformat(),
+                    user_id, since.strftime('%Y-%m-%d %H:00'), f'{first_full_day.isoformat()} 00:00'
+                ))
+                seconds = (await cursor.fetchone())[0]
+            
+            for pending_user_id, _, _, started_at, ended_at in self._pending_sessions:
+                if pending_user_id == user_id and ended_at > since:
+                    seconds += (ended_at - max(started_at, since)).total_seconds()
+            return int(seconds)
+        
+        return await self._stable_read(read)
+    
+    async def get_voice_peak_hours(self, user_id, days=30, limit=3):
+        """Get (hour of day, seconds) of a user's most active hours in the last days"""
+        await self.flush()
+        since = datetime.now() - timedelta(days=days)
+        async with self.acquire() as db:
+            cursor = await db.execute('''
+                SELECT CAST(substr(hour, 12, 2) AS INTEGER) AS hour_of_day, SUM(seconds) AS total
+                FROM voice_rollup_hourly
+                WHERE user_id = ? AND hour >= ?
+                GROUP BY hour_of_day
+                ORDER BY total DESC
+                LIMIT ?
+            ''', (user_id, since.strftime('%Y-%m-%d %H:00'), limit))
+            return await cursor.fetchall()
+    
+    async def prune_voice_history(self, keep_days=90):
+        """Delete raw sessions and hourly rollups older than keep_days, daily rollups are kept"""
+        cutoff = datetime.now() - timedelta(days=keep_days)
+        async with self.acquire() as db:
+            await db.execute("DELETE FROM voice_sessions WHERE ended_at < ?", (_timestamp(cutoff),))
+            await db.execute(
+                "DELETE FROM voice_rollup_hourly WHERE hour < ?", (cutoff.strftime('%Y-%m-%d %H:00'),)
+            )
+            await db.commit()
+    
+    async def record_heartbeat(self):
+        """Store the time the bot was last known to be tracking voice"""
+        async with self.acquire() as db:
+            await db.execute(UPSERT_BOT_STATE, ('heartbeat', _timestamp(datetime.now())))
             await db.commit()
     
+    async def reconcile_voice_sessions(self, connected):
+        """
+        Close sessions left open by a restart and open one for every connected member
+
+        connected holds (user_id, guild_id, channel_id) of everyone in voice.
+        Stale sessions are banked up to the last heartbeat, so a crash loses
+        or overcounts at most one heartbeat interval. Runs as one transaction.
+        Returns the number of closed sessions.
+        """
+        await self.flush()
+        now = datetime.now()
+        
+        async with self._flush_lock:
+            async with self.acquire() as db:
+                cursor = await db.execute("SELECT value FROM bot_state WHERE key = 'heartbeat'")
+                row = await cursor.fetchone()
+                heartbeat = datetime.fromisoformat(row[0]) if row else None
+                
+                cursor = await db.execute(
+                    "SELECT user_id, session_start FROM voice_activity WHERE session_start IS NOT NULL"
+                )
+                stale = []
+                for user_id, session_start in await cursor.fetchall():
+                    started_at = datetime.fromisoformat(str(session_start))
+                    # Without a heartbeat nothing is known about the time after the start
+                    ended_at = min(now, heartbeat) if heartbeat else started_at
+                    stale.append((user_id, started_at, max(started_at, ended_at)))
+                
+                await db.executemany('''
+                    UPDATE voice_activity
+                    SET total_minutes = total_minutes + ?, session_start = NULL, last_update = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                ''', [
+                    (int((ended_at - started_at).total_seconds() / 60), user_id)
+                    for user_id, started_at, ended_at in stale
+                ])
+                await self._write_voice_sessions(db, [
+                    (user_id, None, None, started_at, ended_at)
+                    for user_id, started_at, ended_at in stale if ended_at > started_at
+                ])
+                
+                await db.executemany('''
+                    INSERT INTO voice_activity (user_id, total_minutes, session_start, last_update)
+                    VALUES (?, 0, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        session_start = excluded.session_start,
+                        last_update = excluded.last_update
+                ''', [(user_id, _timestamp(now)) for user_id, _, _ in connected])
+                
+                await db.execute(UPSERT_BOT_STATE, ('heartbeat', _timestamp(now)))
+                await db.commit()
+        
+        return len(stale)
+    
+    async def get_users_with_voice_minutes(self, user_ids, min_minutes):
+        """Get (user_id, total_minutes) for the given users with at least min_minutes"""
+        await self.flush()
+        async with self.acquire() as db:
+            cursor = await db.execute('''
+                SELECT user_id, total_minutes FROM voice_activity
+                WHERE total_minutes >= ?
+                AND user_id IN (SELECT value FROM json_each(?))
+            ''', (min_minutes, json.dumps(list(user_ids))))
+            return await cursor.fetchall()
+    
     async def register_for_raid(self, raid_id, user_id, username, role, notes=""):
         """Register user for a raid"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.acquire() as db:
             try:
                 await db.execute('''
                     INSERT INTO raid_registrations (raid_id, user_id, username, role, notes)
@@ -131,7 +822,7 @@ class Database:
     
     async def get_raid_registrations(self, raid_id):
         """Get all registrations for a raid"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.acquire() as db:
             cursor = await db.execute('''
                 SELECT user_id, username, role, notes, registered_at 
                 FROM raid_registrations 
@@ -140,28 +831,463 @@ class Database:
             ''', (raid_id,))
             return await cursor.fetchall()
     
-    async def add_temp_voice_channel(self, channel_id, owner_id):
+    async def get_event_registrations(self, event_id):
+        """Get all registrations for an event"""
+        async with self.acquire() as db:
+            cursor = await db.execute('''
+                SELECT user_id, username, role, registered_at 
+                FROM event_registrations 
+                WHERE event_id = ?
+                ORDER BY registered_at
+            ''', (event_id,))
+            return await cursor.fetchall()
+    
+    async def add_temp_voice_channel(self, channel_id, owner_id, guild_id=None):
         """Add temporary voice channel to tracking"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.acquire() as db:
             await db.execute('''
-                INSERT INTO temp_voice_channels (channel_id, owner_id)
-                VALUES (?, ?)
-            ''', (channel_id, owner_id))
+                INSERT INTO temp_voice_channels (channel_id, owner_id, guild_id)
+                VALUES (?, ?, ?)
+            ''', (channel_id, owner_id, guild_id))
             await db.commit()
+        self._temp_voice_owners[channel_id] = owner_id
     
     async def remove_temp_voice_channel(self, channel_id):
         """Remove temporary voice channel from tracking"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.acquire() as db:
             await db.execute(
                 "DELETE FROM temp_voice_channels WHERE channel_id = ?", (channel_id,)
             )
             await db.commit()
+        self._temp_voice_owners.pop(channel_id, None)
     
-    async def get_temp_voice_owner(self, channel_id):
-        """Get owner of temporary voice channel"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT owner_id FROM temp_voice_channels WHERE channel_id = ?", (channel_id,)
+    async def remove_temp_voice_channels(self, channel_ids):
+        """Remove many temporary voice channels from tracking in one transaction"""
+        channel_ids = list(channel_ids)
+        if not channel_ids:
+            return
+        async with self.acquire() as db:
+            await db.executemany(
+                "DELETE FROM temp_voice_channels WHERE channel_id = ?",
+                [(channel_id,) for channel_id in channel_ids]
+            )
+            await db.commit()
+        for channel_id in channel_ids:
+            self._temp_voice_owners.pop(channel_id, None)
+    
+    async def get_temp_voice_channels(self):
+        """Get (channel_id, guild_id) of every tracked temporary voice channel"""
+        async with self.acquire() as db:
+            cursor = await db.execute("SELECT channel_id, guild_id FROM temp_voice_channels")
+            return await cursor.fetchall()
+    
+    async def set_temp_voice_owner(self, channel_id, owner_id):
+        """Hand a tracked temporary voice channel to a new owner"""
+        async with self.acquire() as db:
+            await db.execute(
+                "UPDATE temp_voice_channels SET owner_id = ? WHERE channel_id = ?", (owner_id, channel_id)
             )
-            result = await cursor.fetchone()
-            return result[0] if result else None
+            await db.commit()
+        self._temp_voice_owners[channel_id] = owner_id
+    
+    def get_temp_voice_owner(self, channel_id):
+        """Get owner of temporary voice channel, served from memory"""
+        return self._temp_voice_owners.get(channel_id)
+    
+    def is_temp_voice_channel(self, channel_id):
+        """Check whether a channel is a tracked temporary voice channel"""
+        return channel_id in self._temp_voice_owners
+
+    async def set_temp_voice_trigger(self, guild_id, channel_id, category_id=None, name_template=None, user_limit=None):
+        """Make a channel a join-to-create trigger, None falls back to the temp_voice config"""
+        trigger = TempVoiceTrigger(channel_id, guild_id, category_id, name_template, user_limit)
+        async with self.acquire() as db:
+            await db.execute('''
+                INSERT OR REPLACE INTO temp_voice_triggers
+                    (channel_id, guild_id, category_id, name_template, user_limit)
+                VALUES (?, ?, ?, ?, ?)
+            ''', trigger)
+            await db.commit()
+        self._temp_voice_triggers[channel_id] = trigger
+        return trigger
+    
+    async def remove_temp_voice_trigger(self, channel_id):
+        """Stop a channel from creating temp channels, returns whether it was a trigger"""
+        async with self.acquire() as db:
+            await db.execute("DELETE FROM temp_voice_triggers WHERE channel_id = ?", (channel_id,))
+            await db.commit()
+        return self._temp_voice_triggers.pop(channel_id, None) is not None
+    
+    def get_temp_voice_trigger(self, channel_id):
+        """Get the TempVoiceTrigger of a channel, or None, served from memory"""
+        return self._temp_voice_triggers.get(channel_id)
+    
+    def get_temp_voice_triggers(self, guild_id):
+        """Get all triggers of a guild"""
+        return [trigger for trigger in self._temp_voice_triggers.values() if trigger.guild_id == guild_id]
+
+    async def add_voice_lock(self, guild_id, channel_id, kind, locked_by=None):
+        """Lock a voice channel, returns False if it already had this lock"""
+        async with self.acquire() as db:
+            cursor = await db.execute('''
+                INSERT OR IGNORE INTO voice_locks (channel_id, kind, guild_id, locked_by)
+                VALUES (?, ?, ?, ?)
+            ''', (channel_id, kind, guild_id, locked_by))
+            await db.commit()
+        # The row count decides, concurrent callers cannot both see an insert
+        self._voice_locks[kind].add(channel_id)
+        return cursor.rowcount > 0
+    
+    async def remove_voice_lock(self, channel_id, kind):
+        """Unlock a voice channel, returns False if it did not have this lock"""
+        async with self.acquire() as db:
+            cursor = await db.execute("DELETE FROM voice_locks WHERE channel_id = ? AND kind = ?", (channel_id, kind))
+            await db.commit()
+        self._voice_locks[kind].discard(channel_id)
+        return cursor.rowcount > 0
+    
+    def get_voice_locks(self, kind):
+        """Get the set of channel ids with a lock of this kind (shared, do not modify)"""
+        return self._voice_locks[kind]
+
+def _timestamp(value):
+    return value.isoformat(sep=' ', timespec='seconds')
+
+def _split_by_hour(started_at, ended_at):
+    """Yield (hour start, seconds) for every clock hour a time span touches"""
+    current = started_at
+    while current < ended_at:
+        hour = current.replace(minute=0, second=0, microsecond=0)
+        chunk_end = min(ended_at, hour + timedelta(hours=1))
+        yield hour, (chunk_end - current).total_seconds()
+        current = chunk_end
+
+# Schema migrations, applied in order. The position in the list is the schema
+# version stored in PRAGMA user_version, so new steps are only ever appended.
+
+async def _create_base_tables(db):
+    # Statements use IF NOT EXISTS, databases from before versioning already have them
+    
+    # Economy table
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS economy (
+            user_id INTEGER PRIMARY KEY,
+            balance INTEGER DEFAULT 0,
+            last_daily TIMESTAMP,
+            total_earned INTEGER DEFAULT 0
+        )
+    ''')
+    
+    # Voice activity tracking
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS voice_activity (
+            user_id INTEGER PRIMARY KEY,
+            total_minutes INTEGER DEFAULT 0,
+            session_start TIMESTAMP,
+            last_update TIMESTAMP
+        )
+    ''')
+    
+    # Raid registrations
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS raid_registrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            raid_id TEXT,
+            user_id INTEGER,
+            username TEXT,
+            role TEXT,
+            notes TEXT,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(raid_id, user_id)
+        )
+    ''')
+    
+    # Temporary voice channels
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS temp_voice_channels (
+            channel_id INTEGER PRIMARY KEY,
+            owner_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Modmail threads
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS modmail_threads (
+            user_id INTEGER PRIMARY KEY,
+            channel_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'open'
+        )
+    ''')
+
+async def _index_voice_minutes(db):
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_voice_activity_total_minutes ON voice_activity (total_minutes)"
+    )
+
+async def _create_guild_settings(db):
+    await db.execute(GUILD_SETTINGS_TABLE)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_guild_settings_revision ON guild_settings (revision)"
+    )
+    
+    # Copy guild sections from config.json, rows that already exist are kept
+    config = config_service.get()
+    rows = []
+    
+    guild_id = config.get('guild_id')
+    if guild_id:
+        for section in GUILD_SECTIONS:
+            if section in config:
+                rows.append((guild_id, section, json.dumps(config[section])))
+    
+    # Written by the permissions page as servers.<guild id>.permissions
+    for guild_key, server in config.get('servers', {}).items():
+        if 'permissions' in server:
+            rows.append((int(guild_key), 'permissions', json.dumps(server['permissions'])))
+    
+    for row in rows:
+        await db.execute('''
+            INSERT OR IGNORE INTO guild_settings (guild_id, section, value, revision)
+            VALUES (?, ?, ?, (SELECT COALESCE(MAX(revision), 0) + 1 FROM guild_settings))
+        ''', row)
+
+async def _create_event_tables(db):
+    # Used to be created lazily by the event system on every event and registration
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            event_id TEXT PRIMARY KEY,
+            creator_id INTEGER,
+            title TEXT DEFAULT "",
+            description TEXT,
+            message_id INTEGER,
+            channel_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tables created before titles existed
+    cursor = await db.execute("PRAGMA table_info(events)")
+    if 'title' not in [column[1] for column in await cursor.fetchall()]:
+        await db.execute('ALTER TABLE events ADD COLUMN title TEXT DEFAULT ""')
+    
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS event_registrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT,
+            user_id INTEGER,
+            username TEXT,
+            role TEXT,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(event_id, user_id)
+        )
+    ''')
+
+async def _index_balances(db):
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_economy_balance ON economy (balance DESC, user_id)"
+    )
+
+async def _create_economy_ledger(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS economy_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            reason TEXT,
+            actor_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_economy_ledger_user ON economy_ledger (user_id, id)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_economy_ledger_created_at ON economy_ledger (created_at)"
+    )
+    
+    # Opening entries, so the ledger sums up to the existing balances
+    await db.execute('''
+        INSERT INTO economy_ledger (user_id, delta, reason)
+        SELECT user_id, balance, 'snapshot' FROM economy WHERE balance != 0
+    ''')
+
+async def _create_voice_history(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS voice_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            started_at TIMESTAMP NOT NULL,
+            ended_at TIMESTAMP NOT NULL,
+            seconds INTEGER NOT NULL
+        )
+    ''')
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_voice_sessions_user ON voice_sessions (user_id, ended_at)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_voice_sessions_ended_at ON voice_sessions (ended_at)"
+    )
+    
+    # Seconds per user and hour ("YYYY-MM-DD HH:00") / day ("YYYY-MM-DD")
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS voice_rollup_hourly (
+            user_id INTEGER NOT NULL,
+            hour TEXT NOT NULL,
+            seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, hour)
+        )
+    ''')
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_voice_rollup_hourly_hour ON voice_rollup_hourly (hour)"
+    )
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS voice_rollup_daily (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        )
+    ''')
+
+async def _create_bot_state(db):
+    # Key/value state of the bot itself, e.g. the last heartbeat
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_voice_activity_open_sessions ON voice_activity (session_start) "
+        "WHERE session_start IS NOT NULL"
+    )
+
+async def _add_temp_voice_guild(db):
+    # Lets the garbage collector tell a deleted channel from an unavailable guild
+    await db.execute("ALTER TABLE temp_voice_channels ADD COLUMN guild_id INTEGER")
+
+async def _create_temp_voice_triggers(db):
+    # Join-to-create channels, each with its own category, name template and limit
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS temp_voice_triggers (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            category_id INTEGER,
+            name_template TEXT,
+            user_limit INTEGER
+        )
+    ''')
+
+async def _create_voice_locks(db):
+    # Voice channel locks and rage locks survive restarts
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS voice_locks (
+            channel_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            guild_id INTEGER,
+            locked_by INTEGER,
+            locked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel_id, kind)
+        )
+    ''')
+
+async def _create_payouts(db):
+    # Paid raids and events, outlives ledger compaction so a payout is not repeated by accident
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS payouts (
+            payout_id TEXT PRIMARY KEY,
+            recipients INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            actor_id INTEGER,
+            paid_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            times INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+
+async def _add_guild_setting_replaces(db):
+    # Whole-section writes replace the config.json section instead of being merged over it
+    cursor = await db.execute("PRAGMA table_info(guild_settings)")
+    if 'replaces' not in [column[1] for column in await cursor.fetchall()]:
+        await db.execute("ALTER TABLE guild_settings ADD COLUMN replaces INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS = [
+    _create_base_tables,
+    _index_voice_minutes,
+    _create_guild_settings,
+    _create_event_tables,
+    _index_balances,
+    _create_economy_ledger,
+    _create_voice_history,
+    _create_bot_state,
+    _add_temp_voice_guild,
+    _create_temp_voice_triggers,
+    _create_voice_locks,
+    _create_payouts,
+    _add_guild_setting_replaces,
+]
+
+async def migrate(db):
+    """Bring the schema up to date, each step runs in its own transaction"""
+    cursor = await db.execute("PRAGMA user_version")
+    version = (await cursor.fetchone())[0]
+    
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            cursor = await db.execute("PRAGMA user_version")
+            if (await cursor.fetchone())[0] >= target:
+                await db.rollback()
+                continue
+            
+            await migration(db)
+            await db.execute(f"PRAGMA user_version = {target}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        print(f"🗄️ Datenbank-Schema auf Version {target} aktualisiert")
+
+def _connect_sync(db_path):
+    connection = sqlite3.connect(db_path, timeout=5)
+    connection.execute(GUILD_SETTINGS_TABLE)
+    return connection
+
+def read_guild_settings(db_path, guild_id):
+    """
+    Read the sections stored for a guild (synchronous, for the web interface)
+
+    Returns ({section: value}, sections that replace the config.json section).
+    """
+    connection = _connect_sync(db_path)
+    try:
+        rows = connection.execute(
+            "SELECT section, value, replaces FROM guild_settings WHERE guild_id = ?", (guild_id,)
+        ).fetchall()
+    finally:
+        connection.close()
+    sections = {section: json.loads(value) for section, value, _ in rows}
+    return sections, frozenset(section for section, _, replaces in rows if replaces)
+
+def write_guild_settings(db_path, guild_id, sections, replaced=None):
+    """
+    Write whole section rows of a guild in one transaction (synchronous)
+
+    replaced names the sections that replace the config.json section, by
+    default all of them.
+    """
+    if replaced is None:
+        replaced = sections.keys()
+    connection = _connect_sync(db_path)
+    try:
+        with connection:
+            connection.executemany(UPSERT_GUILD_SETTING, [
+                (guild_id, section, json.dumps(value), int(section in replaced))
+                for section, value in sections.items()
+            ])
+    finally:
+        connection.close()
@@ -1,9 +1,10 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
-import json
 import os
 from database import Database
+from utils.config import config_service
+from utils.voice_router import VoiceRouter
 
 # Bot configuration
 intents = discord.Intents.default()
@@ -13,10 +14,58 @@ intents.members = True
 intents.guilds = True
 
 # Load configuration
-with open('config.json', 'r', encoding='utf-8') as f:
-    config = json.load(f)
+config = config_service.get()
 
-bot = commands.Bot(command_prefix=config['prefix'], intents=intents)
+class GuildBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        # Shared database pool, injected into every cog via bot.db
+        db_config = config.get('database', {})
+        self.db = Database(
+            db_config.get('path', 'guild_bot.db'),
+            pool_size=db_config.get('pool_size', 4),
+            flush_interval=db_config.get('flush_interval', 2.0),
+            flush_batch_size=db_config.get('flush_batch_size', 100)
+        )
+        
+        # Single voice_state_update listener, cogs register their handlers on it
+        self.voice_router = VoiceRouter(self)
+    
+    async def close(self):
+        # Cogs are unloaded first and their loops have stopped before the pool is released
+        loops = [
+            value for cog in self.cogs.values() for value in vars(cog).values()
+            if isinstance(value, tasks.Loop)
+        ]
+        for extension in tuple(self.extensions):
+            try:
+                await self.unload_extension(extension)
+            except Exception as e:
+                print(f'✗ Fehler beim Entladen von {extension}: {e}')
+        for cog in tuple(self.cogs):
+            try:
+                await self.remove_cog(cog)
+            except Exception as e:
+                print(f'✗ Fehler beim Entladen von {cog}: {e}')
+        
+        running = []
+        for loop in loops:
+            loop.cancel()
+            if loop.get_task() is not None:
+                running.append(loop.get_task())
+        await asyncio.gather(*running, return_exceptions=True)
+        
+        await super().close()
+        await self.db.close()
+        config_service.stop_watching()
+        config_service.flush()
+
+def get_prefix(bot, message):
+    # Prefix changes from /setup or the web interface apply without a restart
+    return config_service.get().get('prefix', '!')
+
+bot = GuildBot(command_prefix=get_prefix, intents=intents)
 
 @bot.event
 async def on_ready():
@@ -24,8 +73,10 @@ async def on_ready():
     print(f'Verbunden mit {len(bot.guilds)} Server(n)')
     
     # Initialize database
-    db = Database()
-    await db.initialize()
+    await bot.db.initialize()
+    
+    # Pick up config.json edits (web interface, /setup) while running
+    config_service.start_watching()
     
     # Load all cogs
     cogs_to_load = [
@@ -59,6 +110,8 @@ async def on_command_error(ctx, error):
     """Global error handler"""
     if isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(f"❌ Fehlender Parameter: `{error.param.name}`")
+    elif isinstance(error, commands.BadArgument):
+        await ctx.send(f"❌ Ungültiger Parameter: {error}")
     elif isinstance(error, commands.CommandNotFound):
         return  # Ignore command not found errors
     elif isinstance(error, commands.MissingPermissions):
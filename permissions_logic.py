@@ -1,6 +1,7 @@
-import json
 import discord
 from flask import Flask, request, render_template, redirect, url_for
+from utils.config import config_service
+from database import write_guild_settings
 
 app = Flask(__name__)
 bot_instance = None  # Setze dies auf deine Bot-Instanz in web_config
@@ -30,17 +31,6 @@ def save_permissions():
     if not guild_id:
         return "Guild-ID fehlt", 400
 
-    try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            config = json.load(f)
-    except FileNotFoundError:
-        config = {}
-
-    if "servers" not in config:
-        config["servers"] = {}
-    if guild_id not in config["servers"]:
-        config["servers"][guild_id] = {}
-
     permissions = {}
     commands = ["ban", "mute", "raid", "setup", "verify"]
     for cmd in commands:
@@ -51,19 +41,16 @@ def save_permissions():
             "roles": [int(rid) for rid in selected_roles]
         }
 
-    config["servers"][guild_id]["permissions"] = permissions
-
-    with open("config.json", "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=4, ensure_ascii=False)
+    db_path = config_service.get().get("database", {}).get("path", "guild_bot.db")
+    write_guild_settings(db_path, int(guild_id), {"permissions": permissions})
 
     return "✅ Berechtigungen gespeichert."
 
 def check_permission(member, guild_id, command_name):
     try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = config_service.for_guild(int(guild_id))
 
-        permissions = config["servers"].get(str(guild_id), {}).get("permissions", {})
+        permissions = config.get("permissions", {})
         command_rule = permissions.get(command_name)
         if not command_rule:
             return True
@@ -0,0 +1,280 @@
+import asyncio
+import atexit
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, writers are then only serialized per process
+    fcntl = None
+
+class ConfigService:
+    """
+    In-memory snapshot of config.json
+
+    The file is only re-read when its modification time changes, so callers
+    can ask for the configuration on every command without touching the disk.
+    Listeners registered with subscribe() are called with the new snapshot
+    whenever a reload changes the content.
+
+    Writes go through update(): changes are applied to the snapshot at once
+    and written to disk shortly after, so a burst of updates costs a single
+    write. The file is replaced atomically and writers in the bot and web
+    processes are serialized with a lock file.
+
+    Guild-scoped sections (roles, channels, ...) can be overridden per guild
+    with set_guild_overrides(); for_guild() returns the merged view, where a
+    guild's keys are laid over the config.json section, or replace it for
+    sections the guild set as a whole. The overrides themselves are stored in
+    the guild_settings table.
+    """
+
+    def __init__(self, path='config.json', check_interval=1.0, write_delay=0.5):
+        self.path = path
+        self.check_interval = check_interval
+        self.write_delay = write_delay
+
+        self._pending_updates = []
+        self._write_timer = None
+        self._write_lock = threading.RLock()
+
+        self._data = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._listeners = []
+        self._watch_task = None
+        self._loop = None  # Event loop listeners run on, set by start_watching()
+
+        self._guild_overrides = {}  # guild id -> {section: value}
+        self._replaced_sections = {}  # guild id -> sections not merged with config.json
+        self._guild_views = {}  # guild id -> merged configuration
+
+        self.reload()
+
+    def get(self):
+        """Get the current configuration (shared snapshot, do not modify)"""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self.reload_if_changed()
+        return self._data
+
+    def for_guild(self, guild_id):
+        """Get the configuration of a guild (shared snapshot, do not modify)"""
+        base = self.get()
+        if guild_id is None:
+            return base
+
+        view = self._guild_views.get(guild_id)
+        if view is None:
+            overrides = self._guild_overrides.get(guild_id)
+            if not overrides:
+                return base
+
+            # Keys a guild did not set keep following config.json
+            replaced = self._replaced_sections.get(guild_id, ())
+            view = dict(base)
+            for section, value in overrides.items():
+                if section not in replaced and isinstance(value, dict) and isinstance(base.get(section), dict):
+                    value = {**base[section], **value}
+                view[section] = value
+            self._guild_views[guild_id] = view
+        return view
+
+    def set_guild_overrides(self, guild_id, sections, replaced=()):
+        """Replace the per-guild sections of a guild, replaced ones are not merged with config.json"""
+        self._guild_overrides[guild_id] = dict(sections)
+        self._replaced_sections[guild_id] = frozenset(replaced)
+        self._guild_views.pop(guild_id, None)
+        self._notify(self._data)
+
+    def copy(self):
+        """Get a private copy of the configuration that may be modified"""
+        return copy.deepcopy(self.get())
+
+    def reload_if_changed(self):
+        """Reload the file if it was modified since the last read"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+        if mtime == self._mtime:
+            return False
+
+        self.reload()
+        return True
+
+    def reload(self):
+        """Read the configuration file from disk"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data, mtime = {}, None
+        except json.JSONDecodeError as e:
+            # Keep the last good snapshot while the file is being rewritten
+            print(f"❌ Fehler beim Lesen von {self.path}: {e}")
+            return
+
+        # Updates that are not written yet stay visible
+        with self._write_lock:
+            for key_path, value in self._pending_updates:
+                set_path(data, key_path, value)
+
+        old_data = self._data
+        self._data = data
+        self._mtime = mtime
+        self._last_check = time.monotonic()
+        self._guild_views = {}
+
+        if data != old_data:
+            self._notify(data)
+
+    def update(self, key_path, value):
+        """Set a (dot separated) key and schedule a coalesced write"""
+        with self._write_lock:
+            data = copy.deepcopy(self._data)
+            set_path(data, key_path, value)
+            self._data = data
+            self._guild_views = {}
+            self._pending_updates.append((key_path, value))
+
+            if self._write_timer is None:
+                self._write_timer = threading.Timer(self.write_delay, self.flush)
+                self._write_timer.start()
+
+        self._notify(data)
+
+    def flush(self):
+        """Write all pending updates to disk now"""
+        with self._write_lock:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+
+            updates, self._pending_updates = self._pending_updates, []
+            if not updates:
+                return
+
+            try:
+                with self._file_lock():
+                    # Apply on top of the file so edits from the other process survive
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                    except FileNotFoundError:
+                        data = {}
+
+                    for key_path, value in updates:
+                        set_path(data, key_path, value)
+
+                    self._write_atomic(data)
+            except Exception as e:
+                print(f"❌ Fehler beim Speichern von {self.path}: {e}")
+                self._pending_updates = updates + self._pending_updates
+                raise
+
+            # Re-read on the next access, listeners then see edits from other processes
+            self._mtime = None
+            self._last_check = 0.0
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_atomic(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def subscribe(self, callback):
+        """Call callback(config) whenever the configuration changes"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop notifying callback about configuration changes"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, data):
+        # Updates may come from the write timer or another thread, listeners always run on the loop
+        loop = self._loop
+        if loop is not None and not loop.is_closed() and _running_loop() is not loop:
+            loop.call_soon_threadsafe(self._call_listeners, data)
+        else:
+            self._call_listeners(data)
+    
+    def _call_listeners(self, data):
+        for callback in list(self._listeners):
+            try:
+                result = callback(data)
+                if asyncio.iscoroutine(result):
+                    loop = _running_loop()
+                    if loop is None:
+                        result.close()
+                        raise RuntimeError("kein laufender Event-Loop")
+                    loop.create_task(result)
+            except Exception as e:
+                print(f"❌ Fehler im Config-Listener {callback}: {e}")
+
+    def start_watching(self, interval=2.0):
+        """Poll the file in the background so listeners fire without a get() call"""
+        self._loop = asyncio.get_running_loop()
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    def stop_watching(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+    async def _watch(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def set_path(data, key_path, value):
+    """Set a nested value, creating intermediate dictionaries"""
+    keys = key_path.split('.')
+    current = data
+    for key in keys[:-1]:
+        if not isinstance(current.get(key), dict):
+            current[key] = {}
+        current = current[key]
+    current[keys[-1]] = value
+
+# Shared by the bot, the cogs and the web interface
+config_service = ConfigService()
+atexit.register(config_service.flush)
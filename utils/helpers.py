@@ -1,13 +1,12 @@
 import discord
-import json
 from datetime import datetime, timedelta
 import asyncio
 import re
+from utils.config import config_service
 
 def load_config():
-    """Load bot configuration"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Get the cached bot configuration"""
+    return config_service.get()
 
 def format_time_duration(seconds):
     """Format seconds into a readable time duration"""
@@ -1,12 +1,116 @@
 import discord
 from discord.ext import commands
-import json
 from functools import wraps
+from utils.config import config_service
+
+# Highest level first, used by get_user_permission_level
+PERMISSION_HIERARCHY = ['admin', 'moderator', 'raid_leader', 'member', 'rekrut']
 
 def load_config():
-    """Load configuration file"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Get the cached configuration"""
+    return config_service.get()
+
+class PermissionResolver:
+    """
+    Role checks compiled into role-id sets
+
+    Role names and command permissions of a guild's configuration are turned
+    into frozensets of role ids on first use after a config change, so a check
+    is a single set intersection with the member's current role ids.
+    """
+    
+    def __init__(self):
+        self._guilds = {}  # guild id -> (role ids by name, command roles, role set cache)
+        
+        config_service.subscribe(self.compile)
+    
+    def compile(self, config=None):
+        """Drop the compiled role-id sets, they are rebuilt per guild on next use"""
+        self._guilds = {}
+    
+    def _compiled(self, guild_id):
+        config_service.get()  # Recompiles if config.json changed
+        compiled = self._guilds.get(guild_id)
+        if compiled is None:
+            config = config_service.for_guild(guild_id)
+            role_ids = {name: role_id for name, role_id in config.get('roles', {}).items() if role_id}
+            command_roles = {}
+            compiled = (role_ids, command_roles, {})
+            for command, role_names in config.get('command_permissions', {}).items():
+                command_roles[command] = (list(role_names), self._role_set(compiled, role_names))
+            self._guilds[guild_id] = compiled
+        return compiled
+    
+    def _role_set(self, compiled, role_names):
+        role_ids, _, role_sets = compiled
+        key = tuple(role_names)
+        role_set = role_sets.get(key)
+        if role_set is None:
+            role_set = frozenset(role_ids[name] for name in key if name in role_ids)
+            role_sets[key] = role_set
+        return role_set
+    
+    def role_set(self, guild_id, role_names):
+        """Get the configured role ids of a guild for a list of role names"""
+        return self._role_set(self._compiled(guild_id), role_names)
+    
+    def command_role_names(self, guild_id, command_name, default_roles):
+        """Get the role names allowed to use a command"""
+        command_roles = self._compiled(guild_id)[1]
+        if command_name and command_name in command_roles:
+            return command_roles[command_name][0]
+        return default_roles
+    
+    def member_role_ids(self, member):
+        """Get the current role ids of a member"""
+        # Never cached, member.roles is already in memory and a stale set could outlive a kick
+        if getattr(member, 'guild', None) is None:
+            return frozenset()
+        return frozenset(role.id for role in member.roles)
+    
+    def is_owner(self, member):
+        guild = getattr(member, 'guild', None)
+        return guild is not None and member.id == guild.owner_id
+    
+    def has_any(self, member, role_names):
+        """Check if a member is the owner or has any of the named roles"""
+        if self.is_owner(member):
+            return True
+        allowed = self.role_set(_guild_id(member), role_names)
+        return not allowed.isdisjoint(self.member_role_ids(member))
+    
+    def can_use(self, member, command_name, default_roles):
+        """Check a command, honoring custom command permissions"""
+        if self.is_owner(member):
+            return True
+        
+        compiled = self._compiled(_guild_id(member))
+        command_roles = compiled[1]
+        if command_name and command_name in command_roles:
+            allowed = command_roles[command_name][1]
+        else:
+            allowed = self._role_set(compiled, default_roles)
+        return not allowed.isdisjoint(self.member_role_ids(member))
+    
+    def permission_level(self, member):
+        """Get the highest configured permission level of a member"""
+        if self.is_owner(member):
+            return 'owner'
+        
+        configured = self._compiled(_guild_id(member))[0]
+        role_ids = self.member_role_ids(member)
+        for role_name in PERMISSION_HIERARCHY:
+            role_id = configured.get(role_name)
+            if role_id and role_id in role_ids:
+                return role_name
+        return 'none'
+
+def _guild_id(member):
+    guild = getattr(member, 'guild', None)
+    return guild.id if guild is not None else None
+
+# Single resolver for prefix and slash commands
+permission_resolver = PermissionResolver()
 
 def has_role_permission(required_roles, command_name=None):
     """
@@ -19,31 +123,19 @@ def has_role_permission(required_roles, command_name=None):
     def decorator(func):
         @wraps(func)
         async def wrapper(self, ctx, *args, **kwargs):
-            config = load_config()
-            
-            # Server owners and bot owners bypass all restrictions
-            if ctx.author.id == ctx.guild.owner_id:
+            if permission_resolver.can_use(ctx.author, command_name, required_roles):
                 return await func(self, ctx, *args, **kwargs)
             
-            # Check for custom command permissions first
-            custom_permissions = config.get('command_permissions', {})
-            if command_name and command_name in custom_permissions:
-                required_roles = custom_permissions[command_name]
-            
-            # Check if user has any of the required roles
-            user_role_ids = [role.id for role in ctx.author.roles]
-            
-            for role_name in required_roles:
-                role_id = config['roles'].get(role_name)
-                if role_id and role_id in user_role_ids:
-                    return await func(self, ctx, *args, **kwargs)
+            allowed_roles = permission_resolver.command_role_names(
+                ctx.guild.id if ctx.guild else None, command_name, required_roles
+            )
             
             # Create error embed
             embed = discord.Embed(
                 title="❌ Keine Berechtigung",
                 description=f"Du benötigst eine der folgenden Rollen um diesen Befehl zu verwenden:\n\n"
                            f"**Benötigte Rollen:**\n" + 
-                           "\n".join([f"• {role_name.capitalize()}" for role_name in required_roles]),
+                           "\n".join([f"• {role_name.capitalize()}" for role_name in allowed_roles]),
                 color=0xFF6B6B
             )
             embed.set_footer(text="Kontaktiere einen Administrator wenn du glaubst, dass dies ein Fehler ist.")
@@ -56,56 +148,21 @@ def has_role_permission(required_roles, command_name=None):
 def is_bot_admin():
     """Check if user is a bot administrator"""
     def predicate(ctx):
-        config = load_config()
-        admin_role_id = config['roles'].get('admin')
-        
-        if ctx.author.id == ctx.guild.owner_id:
-            return True
-            
-        if admin_role_id:
-            return any(role.id == admin_role_id for role in ctx.author.roles)
-        
-        return False
+        return permission_resolver.has_any(ctx.author, ['admin'])
     
     return commands.check(predicate)
 
 def is_moderator_or_higher():
     """Check if user is a moderator or has higher permissions"""
     def predicate(ctx):
-        config = load_config()
-        
-        if ctx.author.id == ctx.guild.owner_id:
-            return True
-        
-        user_role_ids = [role.id for role in ctx.author.roles]
-        
-        # Check for admin or moderator roles
-        for role_name in ['admin', 'moderator']:
-            role_id = config['roles'].get(role_name)
-            if role_id and role_id in user_role_ids:
-                return True
-                
-        return False
+        return permission_resolver.has_any(ctx.author, ['admin', 'moderator'])
     
     return commands.check(predicate)
 
 def can_manage_raids():
     """Check if user can manage raids"""
     def predicate(ctx):
-        config = load_config()
-        
-        if ctx.author.id == ctx.guild.owner_id:
-            return True
-        
-        user_role_ids = [role.id for role in ctx.author.roles]
-        
-        # Check for admin, moderator, or raid_leader roles
-        for role_name in ['admin', 'moderator', 'raid_leader']:
-            role_id = config['roles'].get(role_name)
-            if role_id and role_id in user_role_ids:
-                return True
-                
-        return False
+        return permission_resolver.has_any(ctx.author, ['admin', 'moderator', 'raid_leader'])
     
     return commands.check(predicate)
 
@@ -128,27 +185,14 @@ async def send_permission_error(ctx, required_roles):
     embed.set_footer(text="Kontaktiere einen Administrator bei Fragen.")
     await ctx.send(embed=embed)
 
-def get_user_permission_level(member, config):
+def get_user_permission_level(member, config=None):
     """
     Get the permission level of a user
     
     Returns:
         str: Permission level ('owner', 'admin', 'moderator', 'raid_leader', 'member', 'rekrut', 'none')
     """
-    if member.id == member.guild.owner_id:
-        return 'owner'
-    
-    user_role_ids = [role.id for role in member.roles]
-    
-    # Check in order of hierarchy
-    permission_hierarchy = ['admin', 'moderator', 'raid_leader', 'member', 'rekrut']
-    
-    for role_name in permission_hierarchy:
-        role_id = config['roles'].get(role_name)
-        if role_id and role_id in user_role_ids:
-            return role_name
-    
-    return 'none'
+    return permission_resolver.permission_level(member)
 
 def format_permission_error(required_permissions, user_permission):
     """Format a detailed permission error message"""
@@ -189,22 +233,4 @@ def check_command_permission(user, command_name, default_roles):
     Returns:
         bool: True if user has permission, False otherwise
     """
-    config = load_config()
-    
-    # Server owners bypass all restrictions
-    if user.id == user.guild.owner_id:
-        return True
-    
-    # Check for custom command permissions
-    custom_permissions = config.get('command_permissions', {})
-    required_roles = custom_permissions.get(command_name, default_roles)
-    
-    # Check if user has any of the required roles
-    user_role_ids = [role.id for role in user.roles]
-    
-    for role_name in required_roles:
-        role_id = config['roles'].get(role_name)
-        if role_id and role_id in user_role_ids:
-            return True
-    
-    return False
+    return permission_resolver.can_use(user, command_name, default_roles)
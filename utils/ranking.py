@@ -0,0 +1,73 @@
+from bisect import bisect_left, bisect_right, insort
+
+class BalanceRanking:
+    """
+    Positive balances kept sorted by (balance descending, user id)
+
+    Balance changes move a single entry, so the top of the leaderboard and
+    the rank of any user are answered from memory without a query. Pages are
+    found by seeking to the (balance, user id) of a cursor entry, never by offset.
+    """
+
+    def __init__(self):
+        self._balances = {}  # user_id -> balance
+        self._keys = []  # sorted (-balance, user_id)
+
+    def load(self, rows):
+        """Replace the ranking with (user_id, balance) rows"""
+        self._balances = {user_id: balance for user_id, balance in rows if balance > 0}
+        self._keys = sorted((-balance, user_id) for user_id, balance in self._balances.items())
+
+    def apply(self, user_id, delta):
+        """Move a user by a balance change"""
+        old_balance = self._balances.get(user_id, 0)
+        new_balance = old_balance + delta
+        if new_balance == old_balance:
+            return
+
+        if old_balance > 0:
+            del self._keys[bisect_left(self._keys, (-old_balance, user_id))]
+
+        if new_balance > 0:
+            self._balances[user_id] = new_balance
+            insort(self._keys, (-new_balance, user_id))
+        else:
+            self._balances.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def rank(self, user_id):
+        """Get the 1-based rank of a user, or None without a positive balance"""
+        balance = self._balances.get(user_id)
+        if balance is None:
+            return None
+        return bisect_left(self._keys, (-balance, user_id)) + 1
+
+    def top(self, limit):
+        """Get the first (user_id, balance) entries"""
+        return self._entries(0, limit)
+
+    def page_after(self, cursor, limit):
+        """
+        Get (position, entries) of the page following a cursor
+
+        The cursor is the (user_id, balance) of the last entry of the previous
+        page, None starts at the top. Position is the 0-based index of the
+        first entry.
+        """
+        start = 0
+        if cursor is not None:
+            user_id, balance = cursor
+            start = bisect_right(self._keys, (-balance, user_id))
+        return start, self._entries(start, start + limit)
+
+    def page_before(self, cursor, limit):
+        """Get (position, entries) of the page preceding a (user_id, balance) cursor"""
+        user_id, balance = cursor
+        end = bisect_left(self._keys, (-balance, user_id))
+        start = max(0, end - limit)
+        return start, self._entries(start, start + limit)
+
+    def _entries(self, start, end):
+        return [(user_id, -balance) for balance, user_id in self._keys[start:end]]
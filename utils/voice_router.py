@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+from utils.config import config_service
+
+# Kinds of voice state updates
+JOIN = 'join'
+LEAVE = 'leave'
+SWITCH = 'switch'
+STATE = 'state'  # Mute, deafen, stream or video toggled without changing channel
+
+ALL_KINDS = (JOIN, LEAVE, SWITCH, STATE)
+
+class VoiceEvent:
+    """A voice state update, classified once and shared by all handlers"""
+
+    def __init__(self, member, before, after):
+        self.member = member
+        self.before = before
+        self.after = after
+        self.now = datetime.now()
+
+        if before.channel is None:
+            self.kind = JOIN
+        elif after.channel is None:
+            self.kind = LEAVE
+        elif before.channel != after.channel:
+            self.kind = SWITCH
+        else:
+            self.kind = STATE
+
+        self._config = None
+
+    @property
+    def guild(self):
+        return self.member.guild
+
+    @property
+    def config(self):
+        """Configuration of the member's guild"""
+        if self._config is None:
+            self._config = config_service.for_guild(self.guild.id)
+        return self._config
+
+class VoiceRouter:
+    """
+    Single on_voice_state_update listener for the whole bot
+
+    Cogs register handlers for the kinds of updates they care about, so a
+    mute toggle only reaches the handlers that asked for STATE updates.
+    Handlers of an event run concurrently and must not depend on each other.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._handlers = {kind: [] for kind in ALL_KINDS}
+        bot.add_listener(self.on_voice_state_update)
+
+    def register(self, handler, *kinds):
+        """Call handler(event) for the given kinds, all kinds if none are given"""
+        for kind in kinds or ALL_KINDS:
+            if handler not in self._handlers[kind]:
+                self._handlers[kind].append(handler)
+
+    def unregister(self, handler):
+        for handlers in self._handlers.values():
+            if handler in handlers:
+                handlers.remove(handler)
+
+    async def on_voice_state_update(self, member, before, after):
+        event = VoiceEvent(member, before, after)
+
+        # A slow handler, e.g. one waiting on Discord, does not hold up the others
+        handlers = self._handlers[event.kind]
+        if handlers:
+            await asyncio.gather(*(self._run(handler, event) for handler in list(handlers)))
+
+    async def _run(self, handler, event):
+        try:
+            await handler(event)
+        except Exception as e:
+            print(f"❌ Fehler im Voice-Handler {handler.__qualname__}: {e}")
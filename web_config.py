@@ -1,6 +1,5 @@
 
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-import json
 import os
 import discord
 from discord.ext import commands
@@ -8,6 +7,9 @@ import asyncio
 import threading
 from functools import wraps
 import traceback
+import copy
+from utils.config import config_service, set_path
+from database import GLOBAL_KEYS, is_guild_setting, read_guild_settings, write_guild_settings
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'your-secret-key-here')
@@ -15,18 +17,54 @@ app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'your-secret-key-here')
 # Global bot instance
 bot_instance = None
 
+def _database_path():
+    return config_service.get().get('database', {}).get('path', 'guild_bot.db')
+
 def load_config():
-    """Load configuration from JSON file"""
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    """Load an editable copy of the configuration of the selected guild"""
+    config = config_service.copy()
+    guild_id = session.get('selected_guild_id')
+    if guild_id:
+        guild_settings, replaced = read_guild_settings(_database_path(), int(guild_id))
+        for section, value in guild_settings.items():
+            # Laid over config.json unless set as a whole, bot-wide keys keep showing the value from config.json
+            if isinstance(value, dict) and isinstance(config.get(section), dict):
+                value = {**({} if section in replaced else config[section]), **value, **{
+                    key: config[section][key] for key in config[section]
+                    if f'{section}.{key}' in GLOBAL_KEYS
+                }}
+            config[section] = value
+    return config
 
-def save_config(config):
-    """Save configuration to JSON file"""
-    with open('config.json', 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=4, ensure_ascii=False)
+def save_config(updates):
+    """
+    Apply (key_path, value) updates
+
+    Guild sections are written to the selected guild's rows in the database,
+    everything else goes to config.json in one coalesced write. A section
+    saved as a whole replaces the config.json section for the guild.
+    """
+    guild_id = session.get('selected_guild_id')
+    # Only the guild's own keys are stored, the rest keeps following config.json
+    guild_settings, replaced = read_guild_settings(_database_path(), int(guild_id)) if guild_id else ({}, frozenset())
+    replaced = set(replaced)
+    sections = {}
+    
+    for key_path, value in updates:
+        section = key_path.split('.', 1)[0]
+        if guild_id and is_guild_setting(key_path):
+            if section not in sections:
+                sections[section] = copy.deepcopy(guild_settings.get(section, {}))
+            if key_path == section:
+                sections[section] = value
+                replaced.add(section)
+            else:
+                set_path(sections[section], key_path.split('.', 1)[1], value)
+        else:
+            config_service.update(key_path, value)
+    
+    if sections:
+        write_guild_settings(_database_path(), int(guild_id), sections, replaced)
 
 def get_discord_guilds():
     """Get all Discord guilds the bot is connected to"""
@@ -293,16 +331,16 @@ def basic_settings():
     config = load_config()
     
     if request.method == 'POST':
-        config['prefix'] = request.form.get('prefix', '!')
+        updates = [('prefix', request.form.get('prefix', '!'))]
         guild_id = request.form.get('guild_id')
         if guild_id:
             try:
-                config['guild_id'] = int(guild_id)
+                updates.append(('guild_id', int(guild_id)))
             except ValueError:
                 flash('Ungültige Guild ID!', 'error')
                 return render_template('basic_settings.html', config=config)
         
-        save_config(config)
+        save_config(updates)
         flash('Grundeinstellungen gespeichert!', 'success')
         return redirect(url_for('index'))
     
@@ -319,22 +357,17 @@ def roles():
         role_names = request.form.getlist('role_names[]')
         role_ids = request.form.getlist('role_ids[]')
         
-        if 'roles' not in config:
-            config['roles'] = {}
-        
-        # Clear existing roles
-        config['roles'] = {}
-        
-        # Update with selected Discord roles
+        # Replace existing roles with the selected Discord roles
+        roles = {}
         for name, role_id in zip(role_names, role_ids):
             if name.strip() and role_id:
                 try:
-                    config['roles'][name.strip()] = int(role_id)
+                    roles[name.strip()] = int(role_id)
                 except ValueError:
                     flash(f'Ungültige ID für Rolle {name}!', 'error')
                     return render_template('roles.html', config=config)
         
-        save_config(config)
+        save_config([('roles', roles)])
         flash('Rollen-Konfiguration gespeichert!', 'success')
         return redirect(url_for('index'))
     
@@ -347,19 +380,17 @@ def channels():
     config = load_config()
     
     if request.method == 'POST':
-        if 'channels' not in config:
-            config['channels'] = {}
-        
+        updates = []
         for channel_name in ['modmail_category', 'temp_voice_category', 'raid_announcements']:
             channel_id = request.form.get(f'channel_{channel_name}')
             if channel_id:
                 try:
-                    config['channels'][channel_name] = int(channel_id)
+                    updates.append((f'channels.{channel_name}', int(channel_id)))
                 except ValueError:
                     flash(f'Ungültige ID für {channel_name}!', 'error')
                     return render_template('channels.html', config=config)
         
-        save_config(config)
+        save_config(updates)
         flash('Kanal-Konfiguration gespeichert!', 'success')
         return redirect(url_for('index'))
     
@@ -373,10 +404,10 @@ def permissions():
     
     # Alle verfügbaren Commands
     all_commands = [
-        "balance", "leaderboard", "give", "take",
+        "balance", "leaderboard", "give", "take", "payout",
         "event", "event-edit", "event_info", "crawler", "carrier",
         "lockvoice", "unlockvoice", "ragelock", "moveall", "voice_stats",
-        "temp_voice", "temp_limit", "temp_name", "temp_kick",
+        "temp_voice", "temp_limit", "temp_name", "temp_kick", "temp_trigger", "temp_queue",
         "createraid", "anmelden", "raid_info", "spice_crawl",
         "modmail", "reply", "close", "force_promote", "setup"
     ]
@@ -394,20 +425,15 @@ def permissions():
 @require_guild_selection
 def update_permission():
     """Update individual command permission"""
-    config = load_config()
-    
     command = request.form.get('command')
     selected_roles = request.form.getlist('roles')
     
     if not command:
         return jsonify({'error': 'Command ist erforderlich'}), 400
     
-    if 'command_permissions' not in config:
-        config['command_permissions'] = {}
-    
     # Allow empty role list to remove all permissions
-    config['command_permissions'][command] = selected_roles
-    save_config(config)
+    # Rapid checkbox clicks are coalesced into a single file write
+    save_config([(f'command_permissions.{command}', selected_roles)])
     
     return jsonify({'success': True, 'message': f'Berechtigungen für {command} aktualisiert'})
 
@@ -418,17 +444,16 @@ def voice_promotion():
     config = load_config()
     
     if request.method == 'POST':
-        if 'voice_promotion' not in config:
-            config['voice_promotion'] = {}
-        
         try:
-            config['voice_promotion']['hours_required'] = int(request.form.get('hours_required', 24))
-            config['voice_promotion']['check_interval'] = int(request.form.get('check_interval', 300))
+            updates = [
+                ('voice_promotion.hours_required', int(request.form.get('hours_required', 24))),
+                ('voice_promotion.check_interval', int(request.form.get('check_interval', 3600)))
+            ]
         except ValueError:
             flash('Ungültige Zahlenwerte!', 'error')
             return render_template('voice_promotion.html', config=config)
         
-        save_config(config)
+        save_config(updates)
         flash('Voice Promotion Einstellungen gespeichert!', 'success')
         return redirect(url_for('index'))
     
@@ -441,18 +466,15 @@ def temp_voice():
     config = load_config()
     
     if request.method == 'POST':
-        if 'temp_voice' not in config:
-            config['temp_voice'] = {}
-        
-        config['temp_voice']['default_name'] = request.form.get('default_name', "{user}'s Channel")
+        updates = [('temp_voice.default_name', request.form.get('default_name', "{user}'s Channel"))]
         
         try:
-            config['temp_voice']['default_limit'] = int(request.form.get('default_limit', 100))
+            updates.append(('temp_voice.default_limit', int(request.form.get('default_limit', 100))))
         except ValueError:
             flash('Ungültiger Zahlenwert für Limit!', 'error')
             return render_template('temp_voice.html', config=config)
         
-        save_config(config)
+        save_config(updates)
         flash('Temp Voice Einstellungen gespeichert!', 'success')
         return redirect(url_for('index'))
     
@@ -491,9 +513,7 @@ def api_discord_guilds():
 @require_guild_selection
 def reset_permissions():
     """Reset all command permissions"""
-    config = load_config()
-    config['command_permissions'] = {}
-    save_config(config)
+    save_config([('command_permissions', {})])
     flash('Alle Berechtigungen wurden zurückgesetzt!', 'success')
     return redirect(url_for('permissions'))
 